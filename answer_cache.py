@@ -0,0 +1,79 @@
+# answer_cache.py
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+CacheKey = Tuple[str, str, str]
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"\s+", " ", question).strip().lower().rstrip("?!. ")
+
+
+def make_key(question: str, context: Optional[str], version: str) -> CacheKey:
+    """Key on the normalized question, the exact context sent, and the prompt/model version."""
+    context_hash = hashlib.sha256((context or "").encode("utf-8")).hexdigest()
+    return normalize_question(question), context_hash, version
+
+
+class AnswerCache:
+    """
+    Exact-match LRU cache of LLM answers with TTL expiry.
+    Entries are tagged with the users that stored them so a user's
+    answers can be dropped when they upload a new document.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 3600.0) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[CacheKey, Tuple[str, float, Set[str]]]" = OrderedDict()
+        self._user_keys: Dict[str, Set[CacheKey]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, username: str, key: CacheKey, answer: str) -> None:
+        with self._lock:
+            users = self._entries[key][2] if key in self._entries else set()
+            users.add(username)
+            self._entries[key] = (answer, time.monotonic() + self.ttl_seconds, users)
+            self._entries.move_to_end(key)
+            self._user_keys.setdefault(username, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, username: str) -> int:
+        """Drop every answer cached for this user. Returns the number removed."""
+        with self._lock:
+            keys = list(self._user_keys.get(username, ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def _remove(self, key: CacheKey) -> None:
+        _, _, users = self._entries.pop(key)
+        for username in users:
+            user_keys = self._user_keys.get(username)
+            if user_keys is not None:
+                user_keys.discard(key)
+                if not user_keys:
+                    del self._user_keys[username]
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,80 @@
+# benchmarks/bench_ann.py
+"""
+Recall vs latency of the HNSW and IVF index modes against exact flat search.
+
+Uses synthetic clustered vectors with the MiniLM-L3 dimension (384), so no
+model download is needed:
+
+    python benchmarks/bench_ann.py --clauses 200000 --queries 1000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vector_store import create_index, set_search_params  # noqa: E402
+
+
+def make_data(n: int, n_queries: int, dim: int, seed: int = 0):
+    """Clustered vectors, closer to sentence embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, n // 100), dim)).astype("float32")
+    data = centers[rng.integers(0, len(centers), n)] + 0.3 * rng.normal(size=(n, dim)).astype("float32")
+    queries = centers[rng.integers(0, len(centers), n_queries)] + 0.3 * rng.normal(size=(n_queries, dim)).astype("float32")
+    data, queries = data.astype("float32"), queries.astype("float32")
+    # Unit length, like the store's embeddings, so inner product is cosine
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return data, queries
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def timed_search(index, queries: np.ndarray, k: int):
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    return found, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clauses", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=4)
+    args = parser.parse_args()
+
+    data, queries = make_data(args.clauses, args.queries, args.dim)
+
+    start = time.perf_counter()
+    flat = create_index(data, "flat")
+    print(f"flat build: {time.perf_counter() - start:.2f}s")
+    truth, flat_ms = timed_search(flat, queries, args.k)
+    print(f"{'index':<6} {'param':<14} {'recall@' + str(args.k):>9} {'ms/query':>9}")
+    print(f"{'flat':<6} {'-':<14} {1.0:>9.3f} {flat_ms:>9.3f}")
+
+    start = time.perf_counter()
+    hnsw = create_index(data, "hnsw")
+    print(f"hnsw build: {time.perf_counter() - start:.2f}s")
+    for ef in (16, 32, 64, 128, 256):
+        set_search_params(hnsw, ef_search=ef)
+        found, ms = timed_search(hnsw, queries, args.k)
+        print(f"{'hnsw':<6} {'efSearch=' + str(ef):<14} {recall_at_k(found, truth):>9.3f} {ms:>9.3f}")
+
+    start = time.perf_counter()
+    ivf = create_index(data, "ivf")
+    print(f"ivf build: {time.perf_counter() - start:.2f}s (nlist={ivf.nlist})")
+    for nprobe in (1, 4, 16, 64):
+        set_search_params(ivf, nprobe=nprobe)
+        found, ms = timed_search(ivf, queries, args.k)
+        print(f"{'ivf':<6} {'nprobe=' + str(nprobe):<14} {recall_at_k(found, truth):>9.3f} {ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
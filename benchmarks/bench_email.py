@@ -0,0 +1,80 @@
+# benchmarks/bench_email.py
+"""
+Email extraction throughput (messages/sec, MB/sec) for every installed HTML
+engine, over a directory of .eml files or a synthetic corpus of HTML
+newsletters with text and HTML attachments.
+
+    python benchmarks/bench_email.py --emails 500
+    python benchmarks/bench_email.py --dir samples/eml
+"""
+import argparse
+import glob
+import os
+import random
+import sys
+import time
+from email.message import EmailMessage
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import extractors  # noqa: E402
+from bench_extractors import WORDS  # noqa: E402
+
+
+def paragraph(rng: random.Random, words: int = 60) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_email(rng: random.Random, paragraphs: int) -> bytes:
+    """A multipart/mixed message: an HTML (sometimes also plain) body and two attachments."""
+    body = [paragraph(rng) for _ in range(paragraphs)]
+    message = EmailMessage()
+    message["Subject"] = "Claim update"
+    message["From"] = "claims@example.com"
+    message["To"] = "customer@example.com"
+    rows = "".join(f"<tr><td><p style='margin:0'>{p}</p></td></tr>" for p in body)
+    html = f"<html><head><style>td {{ padding: 4px }}</style></head><body><table>{rows}</table></body></html>"
+    if rng.random() < 0.5:
+        message.set_content("\n\n".join(body))
+        message.add_alternative(html, subtype="html")
+    else:
+        message.set_content(html, subtype="html")  # HTML-only, as most newsletters are
+    message.add_attachment("\n".join(body).encode(), maintype="text", subtype="plain", filename="policy.txt")
+    message.add_attachment(
+        f"<html><body>{''.join(f'<div>{p}</div>' for p in body)}</body></html>".encode(),
+        maintype="text", subtype="html", filename="schedule.html",
+    )
+    return message.as_bytes()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", help="directory of .eml files; a synthetic corpus is used otherwise")
+    parser.add_argument("--emails", type=int, default=300)
+    parser.add_argument("--paragraphs", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.dir:
+        corpus: List[bytes] = []
+        for path in sorted(glob.glob(os.path.join(args.dir, "*.eml"))):
+            with open(path, "rb") as f:
+                corpus.append(f.read())
+    else:
+        rng = random.Random(0)
+        corpus = [make_email(rng, args.paragraphs) for _ in range(args.emails)]
+    total_mb = sum(len(data) for data in corpus) / 2**20
+
+    print(f"{len(corpus)} emails, {total_mb:.1f} MB")
+    print(f"{'html engine':<12} {'emails/s':>9} {'MB/s':>7} {'chars':>10}")
+    for engine in extractors.available_engines("html"):
+        extractors.DEFAULT_ENGINES["html"] = engine
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            chars = sum(len(extractors.extract_text(data, "eml")) for data in corpus)
+        elapsed = (time.perf_counter() - start) / args.repeat
+        print(f"{engine:<12} {len(corpus) / elapsed:>9.1f} {total_mb / elapsed:>7.2f} {chars:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/bench_extractors.py
+"""
+Pages per second and peak memory of every installed extraction engine.
+Each engine runs in its own process so peak RSS is not shared between them.
+Without --files, a synthetic multi-page PDF is generated with PyMuPDF.
+
+    python benchmarks/bench_extractors.py --files policy.pdf contract.docx --repeat 3
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from extractors import available_engines, detect_format, iter_text  # noqa: E402
+
+WORDS = "the insured shall notify the insurer of any claim within thirty days of discharge".split()
+
+
+def make_pdf(pages: int) -> str:
+    """Write a text-only PDF of the given number of pages and return its path."""
+    import fitz
+
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        lines = [" ".join(WORDS[(number + i) % len(WORDS):] + WORDS[:(number + i) % len(WORDS)]) for i in range(40)]
+        page.insert_textbox(page.rect + (36, 36, -36, -36), "\n".join(lines), fontsize=9)
+    path = os.path.join(tempfile.mkdtemp(), "synthetic.pdf")
+    doc.save(path)
+    return path
+
+
+def run_engine(path: str, fmt: str, engine: str, repeat: int, results: "multiprocessing.Queue") -> None:
+    with open(path, "rb") as f:
+        data = f.read()
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    for _ in range(repeat):
+        pieces = list(iter_text(data, fmt, engine))
+    elapsed = (time.perf_counter() - start) / repeat
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((len(pieces), sum(len(p) for p in pieces), elapsed, (peak_kb - baseline_kb) / 1024))
+
+
+def measure(path: str, fmt: str, engine: str, repeat: int) -> Tuple[int, int, float, float]:
+    results: "multiprocessing.Queue" = multiprocessing.Queue()
+    process = multiprocessing.Process(target=run_engine, args=(path, fmt, engine, repeat, results))
+    process.start()
+    outcome = results.get()
+    process.join()
+    return outcome
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", nargs="*", default=[])
+    parser.add_argument("--pages", type=int, default=200, help="size of the synthetic PDF")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    files: List[str] = args.files or [make_pdf(args.pages)]
+    print(f"{'file':<24} {'engine':<12} {'pages':>6} {'chars':>9} {'pages/s':>9} {'peak MB':>8}")
+    for path in files:
+        fmt = detect_format(path, path)
+        for engine in available_engines(fmt):
+            pages, chars, elapsed, peak_mb = measure(path, fmt, engine, args.repeat)
+            name = os.path.basename(path)[:24]
+            print(f"{name:<24} {engine:<12} {pages:>6} {chars:>9} {pages / elapsed:>9.1f} {peak_mb:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
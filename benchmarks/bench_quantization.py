@@ -0,0 +1,61 @@
+# benchmarks/bench_quantization.py
+"""
+Memory per million clauses and recall loss of the quantized index variants
+(fp16, sq8, pq) against full float32 vectors, with and without exact re-ranking.
+
+    python benchmarks/bench_quantization.py --clauses 100000 --queries 1000
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from vector_store import QUANTIZATIONS, create_index  # noqa: E402
+from bench_ann import make_data, recall_at_k  # noqa: E402
+
+
+def rerank(data: np.ndarray, queries: np.ndarray, shortlist: np.ndarray, k: int) -> np.ndarray:
+    """Exact re-scoring of each query's shortlist, as ClauseVectorStore does from the embedding cache."""
+    out = np.empty((len(queries), k), dtype="int64")
+    for row, (q, candidates) in enumerate(zip(queries, shortlist)):
+        candidates = candidates[candidates >= 0]
+        order = np.argsort(-(data[candidates] @ q))[:k]
+        out[row] = candidates[order]
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clauses", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    data, queries = make_data(args.clauses, args.queries, args.dim)
+    truth = None
+
+    print(f"{'codec':<6} {'MB/1M clauses':>14} {'recall@' + str(args.k):>9} {'+rerank':>8} {'ms/query':>9}")
+    for quantization in QUANTIZATIONS:
+        index = create_index(data, "flat", quantization=quantization)
+        mb_per_million = len(faiss.serialize_index(index)) / index.ntotal * 1_000_000 / 2**20
+
+        start = time.perf_counter()
+        _, found = index.search(queries, args.k * args.rerank_factor)
+        ms = (time.perf_counter() - start) * 1000 / len(queries)
+        if truth is None:
+            truth = found[:, :args.k]
+
+        plain = recall_at_k(found[:, :args.k], truth)
+        reranked = recall_at_k(rerank(data, queries, found, args.k), truth)
+        print(f"{quantization:<6} {mb_per_million:>14.1f} {plain:>9.3f} {reranked:>8.3f} {ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# chat_logging.py
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler over a bounded queue that drops records instead of blocking
+    when the writer thread falls behind (e.g. under disk pressure).
+    """
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]") -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(
+    filename: str = "chat_log.txt",
+    rotation: str = "size",
+    max_bytes: int = 10 * 1024 * 1024,
+    when: str = "midnight",
+    backup_count: int = 5,
+    queue_size: int = 10000,
+    level: int = logging.INFO,
+) -> QueueListener:
+    """
+    Route the root logger through a queue to a background writer thread.
+    The file rotates by size ("size") or on a schedule ("time").
+    Returns the started listener; call stop() on shutdown to flush it.
+    """
+    file_handler: logging.Handler
+    if rotation == "time":
+        file_handler = TimedRotatingFileHandler(
+            filename, when=when, backupCount=backup_count, encoding="utf-8"
+        )
+    else:
+        file_handler = RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+    file_handler.setFormatter(logging.Formatter("%(asctime)s - %(message)s"))
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=queue_size)
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(DroppingQueueHandler(log_queue))
+
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,160 @@
+# context_store.py
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class ContextStore:
+    """
+    Per-user document context held in memory under a global byte budget.
+    When the budget is exceeded, the least recently used users are spilled
+    to disk and transparently reloaded on their next access.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        spill_dir: str = "context_store",
+        on_evict: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.spill_dir = Path(spill_dir)
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        self.on_evict = on_evict
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+
+    def _path(self, username: str) -> Path:
+        return self.spill_dir / f"{hashlib.sha256(username.encode()).hexdigest()}.txt"
+
+    def get(self, username: str) -> str:
+        """Return the user's context, reloading it from disk if it was spilled."""
+        with self._lock:
+            if username in self._memory:
+                self._memory.move_to_end(username)
+                return self._memory[username]
+            path = self._path(username)
+            if not path.exists():
+                return ""
+            text = path.read_text(encoding="utf-8")
+            path.unlink()
+            self._put(username, text)
+            return text
+
+    def set(self, username: str, text: str) -> None:
+        with self._lock:
+            self._path(username).unlink(missing_ok=True)
+            self._put(username, text)
+
+    def append(self, username: str, text: str) -> str:
+        """Append text to the user's context and return the full context."""
+        with self._lock:
+            existing = self.get(username)
+            combined = existing + "\n" + text if existing else text
+            self._put(username, combined)
+            return combined
+
+    def user_bytes(self, username: str) -> int:
+        """Size of the user's context in bytes, whether in memory or on disk."""
+        with self._lock:
+            if username in self._sizes:
+                return self._sizes[username]
+            path = self._path(username)
+            return path.stat().st_size if path.exists() else 0
+
+    @property
+    def total_bytes(self) -> int:
+        """Bytes of context currently held in memory across all users."""
+        return self._total_bytes
+
+    @property
+    def spilled_bytes(self) -> int:
+        """Bytes of context currently spilled to disk."""
+        return sum(p.stat().st_size for p in self.spill_dir.glob("*.txt"))
+
+    def _put(self, username: str, text: str) -> None:
+        size = len(text.encode("utf-8"))
+        self._total_bytes -= self._sizes.get(username, 0)
+        self._memory[username] = text
+        self._memory.move_to_end(username)
+        self._sizes[username] = size
+        self._total_bytes += size
+        self._evict(keep=username)
+
+    def _evict(self, keep: str) -> None:
+        # Spill idle users until under budget; never spill the user just written
+        while self._total_bytes > self.max_bytes and len(self._memory) > 1:
+            username, text = next(iter(self._memory.items()))
+            if username == keep:
+                break
+            self._path(username).write_text(text, encoding="utf-8")
+            del self._memory[username]
+            self._total_bytes -= self._sizes.pop(username)
+            if self.on_evict:
+                self.on_evict(username)
+
+
+class IndexCache(Generic[T]):
+    """
+    Per-user in-memory objects (clause indexes) under their own byte budget.
+    Least recently used entries are dropped once over budget; callers keep a
+    copy on disk and reload it on the next miss.
+    """
+
+    def __init__(self, max_bytes: int, size_of: Callable[[T], int]) -> None:
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self._memory: "OrderedDict[str, T]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def get(self, username: str) -> Optional[T]:
+        with self._lock:
+            item = self._memory.get(username)
+            if item is not None:
+                self._memory.move_to_end(username)
+            return item
+
+    def put(self, username: str, item: T) -> None:
+        """Store (or re-measure after a change) the user's entry."""
+        size = self.size_of(item)
+        with self._lock:
+            self._total_bytes -= self._sizes.get(username, 0)
+            self._memory[username] = item
+            self._memory.move_to_end(username)
+            self._sizes[username] = size
+            self._total_bytes += size
+            # Drop idle users until under budget; never the user just written
+            while self._total_bytes > self.max_bytes and len(self._memory) > 1:
+                oldest = next(iter(self._memory))
+                if oldest == username:
+                    break
+                self._pop(oldest)
+
+    def pop(self, username: str) -> Optional[T]:
+        with self._lock:
+            return self._pop(username)
+
+    def _pop(self, username: str) -> Optional[T]:
+        item = self._memory.pop(username, None)
+        self._total_bytes -= self._sizes.pop(username, 0)
+        return item
+
+    def user_bytes(self, username: str) -> int:
+        with self._lock:
+            return self._sizes.get(username, 0)
+
+    @property
+    def total_bytes(self) -> int:
+        """Bytes of entries currently held in memory across all users."""
+        return self._total_bytes
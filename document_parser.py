@@ -1,70 +1,127 @@
 # document_parser.py
-import requests
-import tempfile
 import os
-import docx
-from bs4 import BeautifulSoup
-from typing import cast
+from concurrent.futures import Future
+from typing import Any, Callable, Iterator, List, Optional, Protocol, Tuple, cast
+from extractors import Source, detect_format, extract_text, iter_text, resolve_engine
+from http_fetch import DownloadCache, get_download_cache
 
-def parse_documents_from_url(url: str) -> str:
+# PDFs with at least this many pages are split across worker processes
+PARALLEL_MIN_PAGES = 64
+# Pages per worker job; small enough that the first pages arrive early
+PAGES_PER_JOB = 16
+# Documents up to this size are parsed from memory instead of being reopened from disk
+IN_MEMORY_MAX_BYTES = int(os.getenv("IN_MEMORY_PARSE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+class PageExecutor(Protocol):
+    """Anything with Executor.submit semantics, e.g. extraction_pool.ExtractionPool."""
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> "Future[Any]": ...
+
+
+def parse_documents_from_url(
+    url: str, cache: Optional[DownloadCache] = None, executor: Optional[PageExecutor] = None
+) -> str:
     """
     Download the document from the given URL and extract its text.
     Supports PDF, DOCX, HTML/EML, TXT.
     """
-    # Stream download to avoid memory overload
-    with tempfile.NamedTemporaryFile(delete=False) as tmp:
-        r = requests.get(url, stream=True, timeout=20)
-        r.raise_for_status()
-        for chunk in r.iter_content(chunk_size=8192):
-            tmp.write(chunk)
-        tmp_path = tmp.name
+    return "\n".join(filter(None, iter_documents_from_url(url, cache, executor))).strip()
 
-    try:
-        if url.lower().endswith(".pdf"):
-            text = extract_text_from_pdf(tmp_path)
-        elif url.lower().endswith(".docx"):
-            text = extract_text_from_docx(tmp_path)
-        elif url.lower().endswith(".eml") or url.lower().endswith(".html"):
-            text = extract_text_from_html(tmp_path)
-        else:
-            text = read_as_text(tmp_path)
-    finally:
-        os.remove(tmp_path)
 
-    return text.strip()
+def iter_documents_from_url(
+    url: str, cache: Optional[DownloadCache] = None, executor: Optional[PageExecutor] = None
+) -> Iterator[str]:
+    """
+    Download the document from the given URL and yield its text in pieces:
+    page by page for PDFs (as soon as each page is extracted), whole text otherwise.
+    Downloads go through the pooled, revalidating download cache; documents up to
+    IN_MEMORY_MAX_BYTES are parsed straight from memory. Large PDFs are split
+    across executor's worker processes when one is given.
+    """
+    # The cached file stays pinned until parsing ends, since page workers reopen it
+    with (cache or get_download_cache()).open_content(url, IN_MEMORY_MAX_BYTES) as (path, content):
+        source: Source = content if content is not None else str(path)
+        fmt = detect_format(source, url.split("?", 1)[0])
+        if fmt == "pdf":
+            for _, page_text in iter_pdf_pages(source, executor, worker_source=str(path)):
+                yield page_text
+        else:
+            yield from iter_text(source, fmt)
 
 
 def extract_text_from_pdf(path: str) -> str:
-    """Extract text from PDF using PyMuPDF."""
+    """Extract text from PDF with the configured PDF engine."""
+    return "\n".join(filter(None, (text for _, text in iter_pdf_pages(path))))
+
+
+def _open_pdf(source: Source):
     import fitz  # local import to avoid type issues
 
-    text_chunks = []
-    with fitz.open(path) as pdf:
-        for page in pdf:
-            # Tell Pylance this has get_text
-            page = cast(fitz.Page, page)
-            text_chunks.append(page.get_text("text"))  # type: ignore[attr-defined]
-    return "\n".join(filter(None, text_chunks))
+    return fitz.open(stream=source, filetype="pdf") if isinstance(source, bytes) else fitz.open(source)
+
+
+def _extract_page_range(source: Source, start: int, stop: int) -> List[str]:
+    """Extract pages [start, stop) of a PDF; runs in a worker process for large files."""
+    import fitz  # local import to avoid type issues
+
+    with _open_pdf(source) as pdf:
+        # Tell Pylance this has get_text
+        return [cast(fitz.Page, pdf[i]).get_text("text") for i in range(start, stop)]  # type: ignore[attr-defined]
+
+
+def iter_pdf_pages(
+    source: Source,
+    executor: Optional[PageExecutor] = None,
+    min_parallel_pages: int = PARALLEL_MIN_PAGES,
+    engine: Optional[str] = None,
+    worker_source: Optional[Source] = None,
+) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page_number, text) for each page of a PDF given as a path or bytes,
+    in order, as pages are extracted; page numbers start at 1.
+    With PyMuPDF and an executor (normally the server's bounded ExtractionPool),
+    large PDFs are split into page ranges parsed in its worker processes.
+    Workers open worker_source if given: pass the file path when source is
+    in-memory bytes, so jobs do not each carry a copy of the document.
+    """
+    engine = resolve_engine("pdf", engine)
+    if engine != "pymupdf":
+        yield from enumerate(iter_text(source, "pdf", engine), start=1)
+        return
+
+    import fitz  # local import to avoid type issues
+
+    with _open_pdf(source) as pdf:
+        page_count = pdf.page_count
+        if page_count < min_parallel_pages or executor is None:
+            for i, page in enumerate(pdf):
+                page = cast(fitz.Page, page)
+                yield i + 1, page.get_text("text")  # type: ignore[attr-defined]
+            return
+
+    job_source = worker_source if worker_source is not None else source
+    ranges = [(start, min(start + PAGES_PER_JOB, page_count)) for start in range(0, page_count, PAGES_PER_JOB)]
+    futures = [executor.submit(_extract_page_range, job_source, start, stop) for start, stop in ranges]
+    try:
+        for (start, _), future in zip(ranges, futures):
+            for offset, text in enumerate(future.result()):
+                yield start + offset + 1, text
+    finally:
+        for future in futures:
+            future.cancel()  # stop queued ranges if the caller gave up or a range failed
 
 
 def extract_text_from_docx(path: str) -> str:
     """Extract text from DOCX file."""
-    text_chunks = []
-    doc = docx.Document(path)
-    for para in doc.paragraphs:
-        if para.text.strip():
-            text_chunks.append(para.text)
-    return "\n".join(text_chunks)
+    return extract_text(path, "docx")
 
 
 def extract_text_from_html(path: str) -> str:
-    """Extract text from HTML/EML using BeautifulSoup."""
-    with open(path, "rb") as f:
-        soup = BeautifulSoup(f.read(), "html.parser")
-    return soup.get_text(separator="\n")
+    """Extract text from HTML."""
+    return extract_text(path, "html")
 
 
 def read_as_text(path: str) -> str:
     """Fallback for plain text files."""
-    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        return f.read()
+    return extract_text(path, "txt")
@@ -0,0 +1,141 @@
+# embedding_cache.py
+import hashlib
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl  # serialize appends across worker processes (POSIX only)
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+
+
+def clause_key(text: str) -> str:
+    """Hash of a clause with whitespace normalized, so re-flowed copies share one entry."""
+    return hashlib.sha1(re.sub(r"\s+", " ", text).strip().encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Append-only on-disk embedding cache for one model.
+    Vectors live in a raw float32 file read through a memory map; a parallel
+    text file holds one clause hash per row and is loaded into a dict.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, dim: int) -> None:
+        self.dim = dim
+        path = Path(cache_dir)
+        path.mkdir(parents=True, exist_ok=True)
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        self.vectors_path = path / f"{safe_name}.f32"
+        self.keys_path = path / f"{safe_name}.keys"
+        self.vectors_path.touch(exist_ok=True)
+        self.keys_path.touch(exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self._rows: Dict[str, int] = {}
+        self._keys_offset = 0
+        self._mmap: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        self._refresh()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def encode(self, texts: List[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Embed texts, calling encode_fn only for texts not already cached.
+        Returns float32 vectors of shape (len(texts), dim) in input order.
+        """
+        keys = [clause_key(t) for t in texts]
+        with self._lock:
+            self._refresh()
+            rows = [self._rows.get(k) for k in keys]
+
+        # Encode each distinct missing clause once
+        missing: Dict[str, str] = {}
+        for key, text, row in zip(keys, texts, rows):
+            if row is None and key not in missing:
+                missing[key] = text
+        if missing:
+            new_vectors = np.ascontiguousarray(encode_fn(list(missing.values())), dtype="float32")
+            self._append(list(missing.keys()), new_vectors)
+
+        with self._lock:
+            rows = [self._rows[k] for k in keys]
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+            return np.asarray(self._vectors()[np.array(rows, dtype="int64")], dtype="float32")
+
+    def lookup(self, texts: List[str]) -> Optional[np.ndarray]:
+        """Cached vectors for texts in input order, or None if any text is not cached."""
+        keys = [clause_key(t) for t in texts]
+        with self._lock:
+            rows = [self._rows.get(k) for k in keys]
+            if any(row is None for row in rows):
+                self._refresh()
+                rows = [self._rows.get(k) for k in keys]
+                if any(row is None for row in rows):
+                    return None
+            return np.asarray(self._vectors()[np.array(rows, dtype="int64")], dtype="float32")
+
+    def _refresh(self) -> None:
+        """Pick up rows appended since the last read, including by other processes."""
+        with open(self.keys_path, "rb") as f:
+            f.seek(self._keys_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partially written line; read it next time
+                self._rows.setdefault(line.rstrip(b"\n").decode("ascii"), len(self._rows))
+                self._keys_offset += len(line)
+
+    def _vectors(self) -> np.ndarray:
+        n = len(self._rows)
+        if self._mmap is None or self._mmap.shape[0] < n:
+            self._mmap = np.memmap(self.vectors_path, dtype="float32", mode="r", shape=(n, self.dim)) if n else None
+        return self._mmap if self._mmap is not None else np.empty((0, self.dim), dtype="float32")
+
+    def _append(self, keys: List[str], vectors: np.ndarray) -> None:
+        with self._lock, open(self.keys_path, "a", encoding="ascii", newline="\n") as keys_file:
+            if fcntl is not None:
+                fcntl.flock(keys_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                new = [(k, v) for k, v in zip(keys, vectors) if k not in self._rows]
+                if not new:
+                    return
+                # Drop vectors from an append that crashed before its keys were written
+                expected_size = len(self._rows) * self.dim * 4
+                if self.vectors_path.stat().st_size != expected_size:
+                    os.truncate(self.vectors_path, expected_size)
+                with open(self.vectors_path, "ab") as vectors_file:
+                    vectors_file.write(np.stack([v for _, v in new]).astype("float32").tobytes())
+                    vectors_file.flush()
+                    os.fsync(vectors_file.fileno())
+                keys_file.write("".join(f"{k}\n" for k, _ in new))
+                keys_file.flush()
+                self._refresh()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(keys_file, fcntl.LOCK_UN)
+
+
+_caches: Dict[Tuple[str, str], EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(model_name: str, dim: int, cache_dir: str = EMBEDDING_CACHE_DIR) -> EmbeddingCache:
+    """Process-wide cache instance per (cache_dir, model_name)."""
+    with _caches_lock:
+        cache = _caches.get((cache_dir, model_name))
+        if cache is None:
+            cache = EmbeddingCache(cache_dir, model_name, dim)
+            _caches[(cache_dir, model_name)] = cache
+        return cache
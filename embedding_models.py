@@ -0,0 +1,42 @@
+# embedding_models.py
+import threading
+import time
+from typing import Dict
+
+from sentence_transformers import SentenceTransformer
+
+_models: Dict[str, SentenceTransformer] = {}
+_load_seconds: Dict[str, float] = {}
+_requests: Dict[str, int] = {}
+_registry_lock = threading.Lock()
+_model_locks: Dict[str, threading.Lock] = {}
+
+
+def get_model(model_name: str) -> SentenceTransformer:
+    """
+    Return the process-wide SentenceTransformer for model_name, loading it on first use.
+    Concurrent first callers wait for a single load instead of loading it twice.
+    """
+    model = _models.get(model_name)
+    if model is None:
+        with _registry_lock:
+            lock = _model_locks.setdefault(model_name, threading.Lock())
+        with lock:
+            model = _models.get(model_name)
+            if model is None:
+                start = time.perf_counter()
+                model = SentenceTransformer(model_name)
+                _load_seconds[model_name] = time.perf_counter() - start
+                _models[model_name] = model
+    with _registry_lock:
+        _requests[model_name] = _requests.get(model_name, 0) + 1
+    return model
+
+
+def model_metrics() -> Dict[str, Dict[str, float]]:
+    """Load time and number of lookups for every model loaded in this process."""
+    with _registry_lock:
+        return {
+            name: {"load_seconds": _load_seconds[name], "requests": _requests.get(name, 0)}
+            for name in _models
+        }
@@ -0,0 +1,86 @@
+# extraction_cache.py
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+
+def content_key(data: bytes, kind: str, parser_version: str) -> str:
+    """Cache key for a document: hash of its bytes plus how it will be parsed."""
+    digest = hashlib.sha256(data).hexdigest()
+    return hashlib.sha256(f"{digest}:{kind}:{parser_version}".encode()).hexdigest()
+
+
+class ExtractionCache:
+    """
+    Two-level cache of extracted document text keyed by content hash.
+    Hot entries live in an in-memory LRU; every entry is also written to
+    disk, where the least recently used files are evicted over max_disk_bytes.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = "extraction_cache",
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        max_disk_bytes: int = 1024 * 1024 * 1024,
+    ) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._memory_bytes = 0
+        self._disk_bytes = sum(p.stat().st_size for p in self.cache_dir.glob("*.txt"))
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.txt"
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            path = self._path(key)
+            try:
+                text = path.read_text(encoding="utf-8")
+                os.utime(path)  # mark as recently used for disk eviction
+            except FileNotFoundError:
+                return None
+            self._remember(key, text)
+            return text
+
+    def put(self, key: str, text: str) -> None:
+        with self._lock:
+            path = self._path(key)
+            if not path.exists():
+                path.write_text(text, encoding="utf-8")
+                self._disk_bytes += path.stat().st_size
+                self._evict_disk()
+            self._remember(key, text)
+
+    def _remember(self, key: str, text: str) -> None:
+        size = len(text.encode("utf-8"))
+        if size > self.max_memory_bytes:
+            return
+        self._memory_bytes -= self._sizes.get(key, 0)
+        self._memory[key] = text
+        self._memory.move_to_end(key)
+        self._sizes[key] = size
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes:
+            old_key, _ = self._memory.popitem(last=False)
+            self._memory_bytes -= self._sizes.pop(old_key)
+
+    def _evict_disk(self) -> None:
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        files = sorted(self.cache_dir.glob("*.txt"), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            self._disk_bytes -= path.stat().st_size
+            path.unlink(missing_ok=True)
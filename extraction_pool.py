@@ -0,0 +1,183 @@
+# extraction_pool.py
+import asyncio
+import itertools
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple, TypeVar
+
+from extractors import UnsupportedFileType, engine_signature, extract_text  # noqa: F401
+
+
+# Bump when parsing output changes so cached extractions are not reused;
+# includes the engine chosen per format, so switching engines also invalidates
+PARSER_VERSION = f"registry-2:{engine_signature()}"
+T = TypeVar("T")
+# Workers are started from a clean server process, never forked from this one:
+# by the time a pool is replaced it has uvicorn, dispatcher, logging and
+# torch/faiss threads, and forking a threaded process can deadlock the child
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+class ExtractionTimeout(TimeoutError):
+    pass
+
+
+def extract_text_from_bytes(filename: str, data: bytes) -> Tuple[str, float]:
+    """
+    Extract text from an uploaded file's bytes, detecting the format from its magic bytes.
+    Runs inside a worker process; returns (text, seconds spent parsing).
+    """
+    start = time.perf_counter()
+    text = extract_text(data, filename=filename)
+    return text, time.perf_counter() - start
+
+
+_started: Optional["multiprocessing.Queue"] = None
+
+
+def _init_worker(started: "multiprocessing.Queue") -> None:
+    """Register the worker's pid, so it can be killed even if it never reports a job."""
+    global _started
+    _started = started
+    started.put((None, os.getpid()))
+
+
+def _kill(pids: Iterable[int]) -> None:
+    for pid in pids:
+        try:
+            os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+        except (ProcessLookupError, PermissionError):
+            pass  # already exited
+
+
+def _run_job(job_id: int, fn: Callable[..., T], args: Tuple[Any, ...]) -> T:
+    """Announce which worker picked up the job, so only that process is killed on timeout."""
+    if _started is not None:
+        _started.put((job_id, os.getpid()))
+    return fn(*args)
+
+
+class ExtractionPool:
+    """
+    Process pool for document parsing so large files never block the event loop.
+    At most max_workers jobs are handed to the processes at a time; the rest
+    wait in a dispatcher queue, so the timeout only measures time spent parsing.
+    A job that exceeds it has its worker process killed and the pool replaced,
+    since a stuck parser cannot be cancelled from the outside.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, timeout: float = 60.0) -> None:
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._dispatcher: Optional[ThreadPoolExecutor] = None
+        self._context = multiprocessing.get_context(START_METHOD)
+        self._started: Optional["multiprocessing.Queue"] = None
+        # Pids of the current pool's workers, and of the worker running each job
+        self._worker_pids: Set[int] = set()
+        self._job_pids: Dict[int, int] = {}
+        self._job_ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._dispatcher is None:
+                self._dispatcher = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="extract")
+            if self._executor is None:
+                self._started = self._context.Queue()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=self._context,
+                    initializer=_init_worker,
+                    initargs=(self._started,),
+                )
+
+    def shutdown(self) -> None:
+        self._drain_started()
+        with self._lock:
+            if self._dispatcher is not None:
+                self._dispatcher.shutdown(wait=False, cancel_futures=True)
+                self._dispatcher = None
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            busy = set(self._job_pids.values())
+            self._job_pids.clear()
+            self._worker_pids.clear()
+        _kill(busy)  # a stuck parser must not outlive the server
+
+    def _replace(self, executor: ProcessPoolExecutor) -> None:
+        """Swap in a fresh process pool unless another job already replaced this one."""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self._job_pids.clear()
+            self._worker_pids.clear()
+        executor.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    def _drain_started(self) -> None:
+        with self._lock:
+            started = self._started
+            while started is not None:
+                try:
+                    job_id, pid = started.get_nowait()
+                except queue.Empty:
+                    break
+                if job_id is None:
+                    self._worker_pids.add(pid)
+                else:
+                    self._job_pids[job_id] = pid
+
+    def _kill_job(self, job_id: int, executor: ProcessPoolExecutor) -> None:
+        self._drain_started()
+        with self._lock:
+            if self._executor is not executor:
+                return  # another job already killed this pool's workers and replaced it
+            pid = self._job_pids.pop(job_id, None)
+            # If the job never reported its worker, it could be any of them
+            pids = {pid} if pid is not None else set(self._worker_pids)
+        _kill(pids)
+        # A dead worker breaks the whole pool; jobs still running on it fail
+        # with BrokenProcessPool and can be retried on the replacement
+        self._replace(executor)
+
+    def _run(self, fn: Callable[..., T], args: Tuple[Any, ...], name: str) -> T:
+        # Runs on a dispatcher thread: a process is free, so the job starts now
+        self.start()
+        executor = self._executor
+        assert executor is not None
+        job_id = next(self._job_ids)
+        future = executor.submit(_run_job, job_id, fn, args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FuturesTimeout:
+            self._kill_job(job_id, executor)
+            raise ExtractionTimeout(f"Extraction of {name} timed out after {self.timeout:.0f}s")
+        except BrokenProcessPool:
+            self._replace(executor)
+            raise
+        finally:
+            self._drain_started()
+            with self._lock:
+                self._job_pids.pop(job_id, None)
+
+    def submit(self, fn: Callable[..., T], *args: Any, name: str = "document") -> "Future[T]":
+        """
+        Queue fn(*args) for a worker process; fn must be a picklable module-level function.
+        The returned future raises ExtractionTimeout if the job runs too long.
+        """
+        self.start()
+        assert self._dispatcher is not None
+        return self._dispatcher.submit(self._run, fn, args, name)
+
+    async def extract(self, filename: str, data: bytes) -> Tuple[str, float]:
+        """Parse one file in the pool. Returns (text, seconds spent parsing)."""
+        return await asyncio.wrap_future(self.submit(extract_text_from_bytes, filename, data, name=filename))
@@ -0,0 +1,267 @@
+# extractors.py
+import io
+import os
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesParser
+from importlib.util import find_spec
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+# A file path or the file's raw bytes
+Source = Union[str, bytes]
+Engine = Callable[[Source], Iterator[str]]
+
+FORMATS = ("pdf", "docx", "html", "eml", "txt")
+HEAD_BYTES = 4096
+EML_ATTACHMENT_WORKERS = int(os.getenv("EML_ATTACHMENT_WORKERS", "4"))
+
+_EML_HEADER = re.compile(
+    rb"^(?:From|To|Subject|Date|Received|Return-Path|Message-ID|MIME-Version|Delivered-To|X-[\w-]+):",
+    re.IGNORECASE,
+)
+
+
+class UnsupportedFileType(ValueError):
+    pass
+
+
+def _head(source: Source) -> bytes:
+    if isinstance(source, bytes):
+        return source[:HEAD_BYTES]
+    with open(source, "rb") as f:
+        return f.read(HEAD_BYTES)
+
+
+def _read(source: Source) -> bytes:
+    if isinstance(source, bytes):
+        return source
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def _as_file(source: Source) -> Union[str, BinaryIO]:
+    return io.BytesIO(source) if isinstance(source, bytes) else source
+
+
+def detect_format(source: Source, filename: str = "") -> str:
+    """
+    Detect the document format from its leading bytes rather than its name.
+    The filename extension is only used to break ties for text-like content.
+    """
+    head = _head(source)
+    if b"%PDF-" in head[:1024]:
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        try:
+            with zipfile.ZipFile(_as_file(source)) as archive:
+                if any(name.startswith("word/") for name in archive.namelist()):
+                    return "docx"
+        except zipfile.BadZipFile:
+            pass
+        raise UnsupportedFileType(f"Unsupported archive: {filename or 'upload'}")
+
+    text_head = head.lstrip(b"\xef\xbb\xbf \t\r\n")
+    # Headers followed by a blank line win over HTML: an HTML-only email still
+    # mentions <html> near the top, inside its first MIME part
+    if _EML_HEADER.match(text_head) and b"\n\n" in text_head.replace(b"\r\n", b"\n"):
+        return "eml"
+    if text_head[:64].lower().startswith((b"<!doctype", b"<html")):
+        return "html"
+    if b"\x00" in head:
+        raise UnsupportedFileType(f"Unsupported binary file: {filename or 'upload'}")
+
+    extension = os.path.splitext(filename.lower())[1].lstrip(".")
+    if extension in ("htm", "html"):
+        return "html"
+    if extension == "eml":
+        return "eml"
+    return "txt"
+
+
+# -------------------------
+# Engines
+# -------------------------
+ENGINES: Dict[str, Dict[str, Engine]] = {fmt: {} for fmt in FORMATS}
+# Module each engine imports; engines whose module is missing are skipped
+ENGINE_MODULES: Dict[str, str] = {}
+
+
+def register_engine(fmt: str, name: str, module: Optional[str] = None) -> Callable[[Engine], Engine]:
+    """Register an extractor yielding text pieces (pages for PDFs) for one format."""
+    def decorator(func: Engine) -> Engine:
+        ENGINES[fmt][name] = func
+        if module:
+            ENGINE_MODULES[name] = module
+        return func
+    return decorator
+
+
+def engine_available(name: str) -> bool:
+    module = ENGINE_MODULES.get(name)
+    return module is None or find_spec(module) is not None
+
+
+def available_engines(fmt: str) -> List[str]:
+    return [name for name in ENGINES[fmt] if engine_available(name)]
+
+
+@register_engine("pdf", "pymupdf", "fitz")
+def _pdf_pymupdf(source: Source) -> Iterator[str]:
+    import fitz
+
+    pdf = fitz.open(stream=source, filetype="pdf") if isinstance(source, bytes) else fitz.open(source)
+    with pdf:
+        for page in pdf:
+            yield page.get_text("text")  # type: ignore[attr-defined]
+
+
+@register_engine("pdf", "pypdf2", "PyPDF2")
+def _pdf_pypdf2(source: Source) -> Iterator[str]:
+    from PyPDF2 import PdfReader
+
+    for page in PdfReader(_as_file(source)).pages:
+        yield page.extract_text() or ""
+
+
+@register_engine("pdf", "pdfminer", "pdfminer")
+def _pdf_pdfminer(source: Source) -> Iterator[str]:
+    from pdfminer.high_level import extract_pages
+    from pdfminer.layout import LTTextContainer
+
+    for layout in extract_pages(_as_file(source)):
+        yield "".join(element.get_text() for element in layout if isinstance(element, LTTextContainer))
+
+
+@register_engine("docx", "python-docx", "docx")
+def _docx_python_docx(source: Source) -> Iterator[str]:
+    import docx
+
+    doc = docx.Document(_as_file(source))
+    yield "\n".join(p.text for p in doc.paragraphs if p.text.strip())
+
+
+# HTML engines are registered fastest first; the first installed one is the fallback default
+@register_engine("html", "selectolax", "selectolax")
+def _html_selectolax(source: Source) -> Iterator[str]:
+    from selectolax.parser import HTMLParser
+
+    tree = HTMLParser(_read(source))
+    tree.strip_tags(["script", "style", "noscript"])
+    root = tree.body or tree.root
+    if root is not None:
+        yield root.text(separator="\n", strip=True)
+
+
+@register_engine("html", "lxml", "lxml")
+def _html_lxml(source: Source) -> Iterator[str]:
+    import lxml.html
+
+    data = _read(source)
+    if not data.strip():
+        return
+    root = lxml.html.fromstring(data)
+    for element in root.xpath("//script|//style|//noscript"):
+        element.drop_tree()
+    yield "\n".join(text.strip() for text in root.itertext() if text.strip())
+
+
+@register_engine("html", "bs4", "bs4")
+def _html_bs4(source: Source) -> Iterator[str]:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(_read(source), "html.parser")
+    for element in soup(["script", "style", "noscript"]):
+        element.decompose()
+    yield soup.get_text(separator="\n", strip=True)
+
+
+def _attachment_text(attachment: Tuple[bytes, str, Optional[str]]) -> str:
+    data, filename, fmt = attachment
+    try:
+        return extract_text(data, fmt, filename=filename)
+    except UnsupportedFileType:
+        return ""  # images, archives and other attachments without text
+
+
+@register_engine("eml", "email")
+def _eml_email(source: Source) -> Iterator[str]:
+    """
+    Yield the message body (plain text preferred over HTML), then the text of
+    each attachment, extracted in parallel by the engine for its detected format.
+    Attached messages are parsed recursively.
+    """
+    message = BytesParser(policy=policy.default).parsebytes(_read(source))
+    if message["Subject"]:
+        yield f"Subject: {message['Subject']}"
+
+    body = message.get_body(preferencelist=("plain", "html"))
+    if body is not None:
+        content = body.get_content()  # type: ignore[union-attr]
+        if body.get_content_type() == "text/html":
+            yield from iter_text(content.encode("utf-8"), "html")
+        else:
+            yield content
+
+    attachments: List[Tuple[bytes, str, Optional[str]]] = []
+    for part in message.iter_attachments():  # type: ignore[attr-defined]
+        if part.get_content_type() == "message/rfc822":
+            attached = part.get_content()
+            if isinstance(attached, EmailMessage):
+                attachments.append((attached.as_bytes(), part.get_filename() or "", "eml"))
+            continue
+        data = part.get_payload(decode=True)
+        if data:
+            attachments.append((data, part.get_filename() or "", None))
+    if not attachments:
+        return
+    if len(attachments) == 1:
+        yield _attachment_text(attachments[0])
+        return
+    with ThreadPoolExecutor(max_workers=min(EML_ATTACHMENT_WORKERS, len(attachments))) as pool:
+        yield from pool.map(_attachment_text, attachments)
+
+
+@register_engine("txt", "utf-8")
+def _txt_utf8(source: Source) -> Iterator[str]:
+    data = _read(source)
+    yield data.decode("utf-8", errors="ignore")
+
+
+# Fastest available engine per format (see benchmarks/bench_extractors.py),
+# overridable with e.g. PDF_ENGINE=pypdf2
+DEFAULT_ENGINES: Dict[str, str] = {
+    "pdf": os.getenv("PDF_ENGINE", "pymupdf"),
+    "docx": os.getenv("DOCX_ENGINE", "python-docx"),
+    "html": os.getenv("HTML_ENGINE", "selectolax"),
+    "eml": os.getenv("EML_ENGINE", "email"),
+    "txt": "utf-8",
+}
+
+
+def resolve_engine(fmt: str, engine: Optional[str] = None) -> str:
+    """The requested engine, or the default, falling back to any installed engine for the format."""
+    name = engine or DEFAULT_ENGINES[fmt]
+    if name not in ENGINES[fmt]:
+        raise ValueError(f"Unknown {fmt} engine: {name}")
+    if engine is None and not engine_available(name):
+        name = next(iter(available_engines(fmt)), name)
+    return name
+
+
+def engine_signature() -> str:
+    """Engines in use per format, for cache keys that must change with parser output."""
+    return ",".join(f"{fmt}={resolve_engine(fmt)}" for fmt in FORMATS)
+
+
+def iter_text(source: Source, fmt: Optional[str] = None, engine: Optional[str] = None, filename: str = "") -> Iterator[str]:
+    """Yield a document's text in pieces (one per page for PDFs)."""
+    fmt = fmt or detect_format(source, filename)
+    return ENGINES[fmt][resolve_engine(fmt, engine)](source)
+
+
+def extract_text(source: Source, fmt: Optional[str] = None, engine: Optional[str] = None, filename: str = "") -> str:
+    """Extract a document's full text with the chosen (or default) engine for its format."""
+    return "\n".join(filter(None, iter_text(source, fmt, engine, filename)))
@@ -0,0 +1,206 @@
+# http_fetch.py
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DOWNLOAD_CACHE_DIR = os.getenv("DOWNLOAD_CACHE_DIR", "download_cache")
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+
+
+def make_session(pool_size: int = HTTP_POOL_SIZE, retries: int = 2) -> requests.Session:
+    """requests.Session with keep-alive connection pooling and retries on transient errors."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(total=retries, backoff_factor=0.3, status_forcelist=(502, 503, 504)),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class DownloadCache:
+    """
+    On-disk cache of downloaded documents keyed by URL.
+    A cached body is revalidated with If-None-Match / If-Modified-Since, so an
+    unchanged document costs a 304 instead of a full download. The least
+    recently used bodies are evicted over max_disk_bytes, except those of URLs
+    still being fetched or read through open_content().
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DOWNLOAD_CACHE_DIR,
+        session: Optional[requests.Session] = None,
+        timeout: float = 20.0,
+        max_disk_bytes: int = 1024 * 1024 * 1024,
+    ) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.session = session or make_session()
+        self.timeout = timeout
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # url -> (lock, number of fetches and readers using it); dropped when unused.
+        # Bodies of URLs in here are never evicted
+        self._url_locks: Dict[str, Tuple[threading.Lock, int]] = {}
+
+    def _paths(self, url: str) -> Tuple[Path, Path]:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}.body", self.cache_dir / f"{key}.json"
+
+    def fetch(self, url: str) -> Path:
+        """Path of the up-to-date body for url, downloading only if it changed."""
+        return self.fetch_content(url)[0]
+
+    def fetch_content(self, url: str, max_memory_bytes: int = 0) -> Tuple[Path, Optional[bytes]]:
+        """
+        Like fetch(), but bodies up to max_memory_bytes are also returned as bytes,
+        so callers can parse them without reopening the cached file. Larger bodies
+        are spooled straight to disk and returned as None.
+        """
+        with self._using(url) as url_lock, url_lock:
+            return self._fetch_content(url, max_memory_bytes)
+
+    @contextmanager
+    def open_content(self, url: str, max_memory_bytes: int = 0) -> Iterator[Tuple[Path, Optional[bytes]]]:
+        """
+        fetch_content() whose cached body is kept from eviction until the block
+        exits, e.g. while worker processes still open the returned path.
+        """
+        with self._using(url) as url_lock:
+            with url_lock:
+                result = self._fetch_content(url, max_memory_bytes)
+            yield result
+
+    @contextmanager
+    def _using(self, url: str) -> Iterator[threading.Lock]:
+        """Register a user of url for the block and return its fetch lock."""
+        with self._lock:
+            url_lock, users = self._url_locks.get(url, (threading.Lock(), 0))
+            self._url_locks[url] = (url_lock, users + 1)
+        try:
+            yield url_lock
+        finally:
+            with self._lock:
+                url_lock, users = self._url_locks[url]
+                if users == 1:
+                    del self._url_locks[url]
+                else:
+                    self._url_locks[url] = (url_lock, users - 1)
+
+    def _fetch_content(
+        self, url: str, max_memory_bytes: int, conditional: bool = True
+    ) -> Tuple[Path, Optional[bytes]]:
+        """fetch_content() body; the caller holds the URL's lock."""
+        body_path, meta_path = self._paths(url)
+        headers = {}
+        if conditional and body_path.exists() and meta_path.exists():
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as r:
+            if r.status_code == 304 and headers:
+                try:
+                    os.utime(body_path)  # mark as recently used for disk eviction
+                    small = body_path.stat().st_size <= max_memory_bytes
+                    content = body_path.read_bytes() if small else None
+                except FileNotFoundError:
+                    # The body was removed after the check; fetch it again without validators
+                    return self._fetch_content(url, max_memory_bytes, conditional=False)
+                with self._lock:
+                    self.hits += 1
+                return body_path, content
+            r.raise_for_status()
+            content = self._download(r, body_path, max_memory_bytes)
+            meta = {
+                "url": url,
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+            }
+        tmp_meta = meta_path.with_suffix(".json.tmp")
+        tmp_meta.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp_meta, meta_path)
+
+        with self._lock:
+            self.misses += 1
+            self._evict_disk()
+        return body_path, content
+
+    def _download(self, response: requests.Response, body_path: Path, max_memory_bytes: int) -> Optional[bytes]:
+        """
+        Stream the response into body_path, keeping it in memory while it stays
+        under max_memory_bytes. Returns the body if it was kept in memory.
+        """
+        buffer: Optional[bytearray] = bytearray()
+        fd, tmp_name = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    if buffer is not None and len(buffer) + len(chunk) <= max_memory_bytes:
+                        buffer += chunk
+                        continue
+                    if buffer:
+                        tmp.write(buffer)  # too large for memory: spill what we have
+                    buffer = None
+                    tmp.write(chunk)
+                if buffer is not None:
+                    tmp.write(buffer)
+            os.replace(tmp_name, body_path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        return bytes(buffer) if buffer is not None else None
+
+    async def fetch_async(self, url: str) -> Path:
+        """fetch() on a worker thread, sharing the same connection pool."""
+        return await asyncio.to_thread(self.fetch, url)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def _evict_disk(self) -> None:
+        """Delete least recently used bodies over budget; the caller holds self._lock."""
+        in_use = {self._paths(url)[0] for url in self._url_locks}
+        bodies = list(self.cache_dir.glob("*.body"))
+        total = sum(p.stat().st_size for p in bodies)
+        if total <= self.max_disk_bytes:
+            return
+        for path in sorted(bodies, key=lambda p: p.stat().st_mtime):
+            if total <= self.max_disk_bytes:
+                break
+            if path in in_use:
+                continue
+            total -= path.stat().st_size
+            path.unlink(missing_ok=True)
+            path.with_suffix(".json").unlink(missing_ok=True)
+
+
+_default_cache: Optional[DownloadCache] = None
+_default_lock = threading.Lock()
+
+
+def get_download_cache() -> DownloadCache:
+    """Process-wide download cache in DOWNLOAD_CACHE_DIR, created on first use."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = DownloadCache()
+        return _default_cache
@@ -0,0 +1,116 @@
+# lexical_index.py
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this "
+    "to was were what when where which who will with does do under any".split()
+)
+
+
+# Openers of a natural-language question, which dense retrieval handles better
+QUESTION_WORDS = frozenset(
+    "how what when where which who whom whose why is are was were do does did can could "
+    "should would will shall may might must explain describe tell list".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords; short acronyms like "ped" are kept."""
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    In-memory BM25 index over posting lists.
+    Documents are addressed by their insertion position, matching the
+    row ids of the FAISS index they sit next to.
+    """
+
+    # Approximate CPython sizes: a (doc_id, tf) tuple plus its list slot, a
+    # term's key and posting list, and a document's length entry
+    POSTING_BYTES = 64
+    TERM_BYTES = 150
+    DOC_BYTES = 36
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_lengths: List[int] = []
+        self._total_length = 0
+        self._n_postings = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, docs: Sequence[str]) -> None:
+        """Append documents; ids continue from the current size."""
+        for text in docs:
+            doc_id = len(self.doc_lengths)
+            tokens = tokenize(text)
+            for term, tf in Counter(tokens).items():
+                self.postings.setdefault(term, []).append((doc_id, tf))
+                self._n_postings += 1
+            self.doc_lengths.append(len(tokens))
+            self._total_length += len(tokens)
+
+    def memory_bytes(self) -> int:
+        """Estimated in-memory size of the posting lists and document lengths."""
+        return (
+            self._n_postings * self.POSTING_BYTES
+            + len(self.postings) * self.TERM_BYTES
+            + len(self.doc_lengths) * self.DOC_BYTES
+        )
+
+    def search(self, query: str, top_k: int = 4) -> List[Tuple[int, float]]:
+        """Top (doc_id, BM25 score) pairs for the query, best first."""
+        n_docs = len(self.doc_lengths)
+        if n_docs == 0:
+            return []
+        avg_length = self._total_length / n_docs or 1.0
+
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+
+def looks_like_keyword_query(text: str, max_terms: int = 3) -> bool:
+    """
+    True for terse keyword lookups such as "PED" or "grace period": at most
+    max_terms content words, no question mark and no question word.
+    """
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    if not words or "?" in text or len(words) > max_terms + 1:
+        return False
+    if any(word in QUESTION_WORDS for word in words):
+        return False
+    return len(tokenize(text)) <= max_terms
+
+
+def relative_cutoff(hits: List[Tuple[int, float]], min_ratio: float) -> List[Tuple[int, float]]:
+    """Keep best-first BM25 hits scoring at least min_ratio of the best one; weak term matches are dropped."""
+    if not hits:
+        return hits
+    floor = hits[0][1] * min_ratio
+    return [(doc_id, score) for doc_id, score in hits if score >= floor]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """Fuse several best-first id rankings into one, scoring each id by sum(1 / (k + rank))."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -1,7 +1,8 @@
 # llm_reasoning.py
 import os
 import re
-from typing import Optional
+import asyncio
+from typing import AsyncIterator, List, Optional
 from dotenv import load_dotenv
 
 # Import Google Gemini API (suppress Pylance warnings)
@@ -17,28 +18,52 @@ if not GOOGLE_API_KEY:
 genai.configure(api_key=GOOGLE_API_KEY)  # type: ignore
 
 # Instantiate model
+MODEL_NAME = "gemini-1.5-flash"
+# Bump when build_prompt changes so cached answers are not reused
+PROMPT_VERSION = "1"
+
 model = genai.GenerativeModel(  # type: ignore
-    "gemini-1.5-flash",
+    MODEL_NAME,
     generation_config={"temperature": 0.3, "max_output_tokens": 512}
 )
 
+# Cap on concurrent in-flight Gemini calls per worker
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+_llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+MAX_ANSWER_WORDS = 150
+# Clause boundaries: after "." or ";" followed by whitespace, or at a blank line
+SENTENCE_END = re.compile(r"(?<=[.;])\s+|\n{2,}")
+
 def clean_text(text: str) -> str:
     """
     Clean input text by removing extra spaces and line breaks.
     """
     return re.sub(r"\s+", " ", text).strip()
 
-def answer_question(question: str, context: Optional[str] = None) -> str:
+def split_into_clauses(text: str, max_chars: int = 800) -> List[str]:
     """
-    Ask Gemini for a professional, human-like answer.
-    Includes context from a document if provided.
-    Returns a readable and concise answer.
+    Split document text into clauses/sentences of meaningful length.
+    Very long sentences are cut into pieces of at most max_chars.
     """
-    question = clean_text(question)
-    if not question:
-        return "Question is empty."
+    clauses: List[str] = []
+    for sentence in SENTENCE_END.split(text):
+        sentence = clean_text(sentence)
+        if len(sentence) <= 20:
+            continue
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            clauses.append(sentence[:cut])
+            sentence = sentence[cut:].strip()
+        if len(sentence) > 20:
+            clauses.append(sentence)
+    return clauses
 
-    # Build prompt for professional and user-friendly response
+def build_prompt(question: str, context: Optional[str] = None) -> str:
+    """
+    Build the Gemini prompt for a (cleaned) question and optional document context.
+    """
     prompt_lines = [
         "You are a helpful and professional AI assistant.",
         "Explain answers clearly and concisely without using examples or analogies.",
@@ -48,17 +73,95 @@ def answer_question(question: str, context: Optional[str] = None) -> str:
     prompt_lines.append(f"Question: {question}")
     prompt_lines.append("Answer:")
 
-    prompt = "\n\n".join(prompt_lines)
+    return "\n\n".join(prompt_lines)
+
+def trim_answer(answer_text: str) -> str:
+    """
+    Trim very long answers for better readability.
+    """
+    answer_text = answer_text.strip()
+    if len(answer_text.split()) > MAX_ANSWER_WORDS:
+        answer_text = " ".join(answer_text.split()[:MAX_ANSWER_WORDS]) + "..."
+    return answer_text or "No answer returned by Gemini."
+
+def answer_question(question: str, context: Optional[str] = None) -> str:
+    """
+    Ask Gemini for a professional, human-like answer.
+    Includes context from a document if provided.
+    Returns a readable and concise answer.
+    """
+    question = clean_text(question)
+    if not question:
+        return "Question is empty."
+
+    prompt = build_prompt(question, context)
 
     try:
         response = model.generate_content(prompt)  # type: ignore
-        answer_text: str = (response.text or "").strip()
+        return trim_answer(response.text or "")
+
+    except Exception as e:
+        return f"Error generating answer: {e}"
+
+async def answer_question_async(question: str, context: Optional[str] = None) -> str:
+    """
+    Async variant of answer_question for use inside FastAPI handlers.
+    Uses Gemini's native async client so the event loop is never blocked,
+    with at most LLM_MAX_CONCURRENCY calls in flight at once.
+    """
+    question = clean_text(question)
+    if not question:
+        return "Question is empty."
 
-        # Optional: trim very long answers for better readability
-        if len(answer_text.split()) > 150:
-            answer_text = " ".join(answer_text.split()[:150]) + "..."
+    prompt = build_prompt(question, context)
 
-        return answer_text or "No answer returned by Gemini."
+    try:
+        async with _llm_semaphore:
+            response = await model.generate_content_async(prompt)  # type: ignore
+        return trim_answer(response.text or "")
 
     except Exception as e:
         return f"Error generating answer: {e}"
+
+class AnswerStreamError(RuntimeError):
+    pass
+
+async def stream_answer_async(question: str, context: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Stream Gemini's answer as text pieces while it is being generated.
+    Applies the MAX_ANSWER_WORDS cap on the stream and stops generation
+    as soon as the cap is reached. If generation fails, the error message is
+    yielded as a last piece and AnswerStreamError is raised.
+    """
+    question = clean_text(question)
+    if not question:
+        yield "Question is empty."
+        return
+
+    prompt = build_prompt(question, context)
+    answer_text = ""
+    sent = 0
+
+    try:
+        async with _llm_semaphore:
+            response = await model.generate_content_async(prompt, stream=True)  # type: ignore
+            async for chunk in response:  # type: ignore
+                answer_text += chunk.text or ""
+                if sent == 0:
+                    answer_text = answer_text.lstrip()
+                words = list(re.finditer(r"\S+", answer_text))
+                if len(words) > MAX_ANSWER_WORDS:
+                    # Cap reached: flush up to the last allowed word and stop generating
+                    yield answer_text[sent:words[MAX_ANSWER_WORDS - 1].end()] + "..."
+                    return
+                if len(answer_text) > sent:
+                    yield answer_text[sent:]
+                    sent = len(answer_text)
+
+        if not answer_text.strip():
+            yield "No answer returned by Gemini."
+
+    except Exception as e:
+        yield f"Error generating answer: {e}"
+        # Let callers know the streamed text is incomplete, e.g. so it is not cached
+        raise AnswerStreamError(str(e)) from e
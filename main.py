@@ -1,13 +1,32 @@
 from fastapi import FastAPI, HTTPException, Depends, Query, UploadFile, File, Form
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List, Dict
+from typing import AsyncIterator, Optional, List, Dict, Tuple
 from database import init_db, add_user, verify_user
-from llm_reasoning import answer_question
+from llm_reasoning import (
+    AnswerStreamError, answer_question_async, stream_answer_async, split_into_clauses,
+    MODEL_NAME, PROMPT_VERSION, SENTENCE_END,
+)
+from vector_store import ClauseVectorStore
+from multi_tenant_store import MultiTenantVectorStore
+from token_store import TokenStore
+from context_store import ContextStore, IndexCache
+from extraction_pool import ExtractionPool, ExtractionTimeout, UnsupportedFileType, PARSER_VERSION
+from extraction_cache import ExtractionCache, content_key
+from extractors import detect_format
+from answer_cache import AnswerCache, make_key
+from document_parser import iter_documents_from_url
+from chat_logging import setup_logging
+import asyncio
+import hashlib
 import logging
+import os
+import shutil
+import threading
 import uuid
-from PyPDF2 import PdfReader
-import docx
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI(
@@ -30,32 +49,136 @@ app.add_middleware(
 # -------------------------
 # Token store
 # -------------------------
-active_tokens: Dict[str, str] = {}
+TOKEN_EXPIRY_MINUTES = float(os.getenv("TOKEN_EXPIRY", "60"))
+token_store = TokenStore(ttl_seconds=TOKEN_EXPIRY_MINUTES * 60)
+
+# -------------------------
+# Clause index per user (rebuilt once per upload)
+# -------------------------
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+# Cosine cutoffs: skip clauses below RETRIEVAL_MIN_SCORE or after a drop larger than RETRIEVAL_MAX_DROP
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.2"))
+RETRIEVAL_MAX_DROP = float(os.getenv("RETRIEVAL_MAX_DROP", "0.15"))
+# "dense", "lexical", "hybrid", or "auto" (BM25 alone for short keyword queries, else hybrid)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "auto")
+INDEX_DIR = Path(os.getenv("INDEX_DIR", "clause_indexes"))
+# Per-user clause indexes are several times the size of their text, so they get
+# their own LRU budget; evicted indexes are reopened from INDEX_DIR on demand
+CLAUSE_INDEX_MAX_BYTES = int(os.getenv("CLAUSE_INDEX_MAX_BYTES", str(512 * 1024 * 1024)))
+clause_indexes: IndexCache[ClauseVectorStore] = IndexCache(
+    max_bytes=CLAUSE_INDEX_MAX_BYTES, size_of=lambda store: store.memory_bytes()
+)
+# Serializes load -> add -> save and searches on one user's index across threads
+_user_locks: Dict[str, threading.RLock] = {}
+_user_locks_guard = threading.Lock()
+
+def user_lock(username: str) -> threading.RLock:
+    with _user_locks_guard:
+        return _user_locks.setdefault(username, threading.RLock())
+
+# "per_user" keeps one ClauseVectorStore per user; "multi_tenant" shares one
+# ID-filtered index across all users for higher tenant density. The shared
+# index is write-ahead logged and locked to one process: run a single worker.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "per_user")
+MULTI_TENANT_DIR = str(INDEX_DIR / "multi_tenant")
+multi_tenant_store: Optional[MultiTenantVectorStore] = None
+if VECTOR_BACKEND == "multi_tenant":
+    multi_tenant_store = MultiTenantVectorStore.open(
+        MULTI_TENANT_DIR,
+        quantization=os.getenv("MULTI_TENANT_QUANTIZATION", "none"),
+        # The write-ahead log is folded into a new snapshot past this size
+        wal_checkpoint_bytes=int(os.getenv("MULTI_TENANT_WAL_MAX_BYTES", str(64 * 1024 * 1024))),
+    )
+
+# -------------------------
+# Document context store per user (LRU, spills to disk over budget)
+# -------------------------
+CONTEXT_MAX_BYTES = int(os.getenv("CONTEXT_MAX_BYTES", str(256 * 1024 * 1024)))
+document_context = ContextStore(
+    max_bytes=CONTEXT_MAX_BYTES,
+    spill_dir=os.getenv("CONTEXT_SPILL_DIR", "context_store"),
+    on_evict=lambda username: clause_indexes.pop(username),
+)
+
+# -------------------------
+# Answer cache (exact match on question + context sent)
+# -------------------------
+ANSWER_VERSION = f"{MODEL_NAME}:{PROMPT_VERSION}"
+answer_cache = AnswerCache(
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+)
 
 # -------------------------
-# Document context store per user
+# Batch endpoint
 # -------------------------
-document_context: Dict[str, str] = {}
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+# Clauses embedded per incremental add while a document is still being parsed
+STREAM_INDEX_BATCH = int(os.getenv("STREAM_INDEX_BATCH", "256"))
+
+# -------------------------
+# Document extraction pool
+# -------------------------
+extraction_pool = ExtractionPool(
+    max_workers=int(os.getenv("EXTRACT_WORKERS", "0")) or None,
+    timeout=float(os.getenv("EXTRACT_TIMEOUT", "60")),
+)
+extraction_cache = ExtractionCache(
+    cache_dir=os.getenv("EXTRACT_CACHE_DIR", "extraction_cache"),
+    max_memory_bytes=int(os.getenv("EXTRACT_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024))),
+    max_disk_bytes=int(os.getenv("EXTRACT_CACHE_DISK_BYTES", str(1024 * 1024 * 1024))),
+)
 
 # -------------------------
 # Initialize DB
 # -------------------------
+# Held so the task is not garbage-collected and can be cancelled on shutdown
+background_tasks: List[asyncio.Task] = []
+
 @app.on_event("startup")
-def startup_event():
+async def startup_event():
     init_db()
+    extraction_pool.start()
+    background_tasks.append(asyncio.create_task(token_store.run_sweeper()))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    extraction_pool.shutdown()
+    if multi_tenant_store is not None:
+        multi_tenant_store.save(MULTI_TENANT_DIR)
+        multi_tenant_store.close()
+    log_listener.stop()
 
 # -------------------------
 # Security
 # -------------------------
 security = HTTPBearer(auto_error=False)
 
+def get_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+) -> str:
+    """Resolve the bearer token to a username, shared by /chat and /upload."""
+    if not credentials or credentials.scheme.lower() != "bearer":
+        raise HTTPException(status_code=401, detail="Missing or invalid token")
+
+    username = token_store.get_username(credentials.credentials)
+    if username is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return username
+
 # -------------------------
 # Logging
 # -------------------------
-logging.basicConfig(
+log_listener = setup_logging(
     filename="chat_log.txt",
-    level=logging.INFO,
-    format="%(asctime)s - %(message)s"
+    rotation=os.getenv("LOG_ROTATION", "size"),
+    max_bytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+    when=os.getenv("LOG_ROTATE_WHEN", "midnight"),
+    backup_count=int(os.getenv("LOG_BACKUP_COUNT", "5")),
 )
 
 # -------------------------
@@ -68,22 +191,211 @@ class User(BaseModel):
 class ChatResponse(BaseModel):
     answer: str
 
+class QueryRequest(BaseModel):
+    documents: str
+    questions: List[str]
+
+class QueryResponse(BaseModel):
+    answers: List[str]
+
+class ContextStats(BaseModel):
+    user_bytes: int
+    total_bytes: int
+    spilled_bytes: int
+    user_index_bytes: int
+    index_bytes: int
+    indexes_in_memory: int
+
 # -------------------------
-# Helper function
+# Helper functions
 # -------------------------
-def extract_text_from_file(file: UploadFile) -> str:
+async def extract_text_from_file(file: UploadFile) -> str:
+    """
+    Parse one uploaded file in the extraction pool and log how long it took.
+    Repeat uploads of the same bytes are served from the extraction cache.
+    """
     filename = file.filename or ""
-    lower_fname = filename.lower()
-    if lower_fname.endswith(".pdf"):
-        reader = PdfReader(file.file)
-        return "\n".join(page.extract_text() or "" for page in reader.pages)
-    elif lower_fname.endswith(".docx"):
-        doc = docx.Document(file.file)
-        return "\n".join(p.text for p in doc.paragraphs)
-    elif lower_fname.endswith(".txt"):
-        return file.file.read().decode("utf-8")
+    data = await file.read()
+    try:
+        kind = detect_format(data, filename)
+    except UnsupportedFileType as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    key = await asyncio.to_thread(content_key, data, kind, PARSER_VERSION)
+    cached = await asyncio.to_thread(extraction_cache.get, key)
+    if cached is not None:
+        logging.info(f"Extraction cache hit for {filename} ({len(data)} bytes)")
+        return cached
+
+    try:
+        try:
+            text, elapsed = await extraction_pool.extract(filename, data)
+        except BrokenProcessPool:
+            # Another job's timeout (or a crashed worker) took the pool down mid-parse; retry once on the new pool
+            logging.warning(f"Extraction pool broke while parsing {filename}; retrying")
+            text, elapsed = await extraction_pool.extract(filename, data)
+    except UnsupportedFileType as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExtractionTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except BrokenProcessPool:
+        raise HTTPException(status_code=503, detail=f"Extraction of {filename} failed; please retry.")
+    logging.info(f"Extracted {filename} ({len(data)} bytes) in {elapsed:.3f}s")
+    await asyncio.to_thread(extraction_cache.put, key, text)
+    return text
+
+def build_clause_index(text: str) -> Optional[ClauseVectorStore]:
+    """Chunk document text into clauses and index them. Returns None if nothing to index."""
+    clauses = split_into_clauses(text)
+    if not clauses:
+        return None
+    store = ClauseVectorStore()
+    store.build_index(clauses)
+    return store
+
+def user_index_dir(username: str) -> str:
+    return str(INDEX_DIR / hashlib.sha256(username.encode()).hexdigest())
+
+def save_clause_index(username: str, store: Optional[ClauseVectorStore]) -> None:
+    """Keep the user's on-disk index in step with their latest upload."""
+    if store is None:
+        shutil.rmtree(user_index_dir(username), ignore_errors=True)
     else:
-        raise HTTPException(status_code=400, detail=f"Unsupported file type: {filename}")
+        store.save(user_index_dir(username))
+
+def cache_clause_index(username: str, store: ClauseVectorStore) -> None:
+    """
+    Keep the user's index in memory under CLAUSE_INDEX_MAX_BYTES. The BM25 index
+    that non-dense retrieval needs is built first, so the budget counts it.
+    """
+    if RETRIEVAL_MODE != "dense":
+        store.lexical_index()
+    clause_indexes.put(username, store)
+
+def get_clause_index(username: str) -> Optional[ClauseVectorStore]:
+    """
+    The user's clause index: from memory, else reopened from disk, else rebuilt from context.
+    Callers hold user_lock(username).
+    """
+    store = clause_indexes.get(username)
+    if store is None:
+        # Not in memory (restart or context spilled): reopen from disk, else rebuild
+        index_dir = user_index_dir(username)
+        if ClauseVectorStore.exists(index_dir):
+            try:
+                store = ClauseVectorStore.load(index_dir)
+            except (ValueError, RuntimeError, OSError) as e:
+                # Unreadable or out-of-sync index: rebuild it from the stored context
+                logging.warning(f"Rebuilding clause index for {username}: {e}")
+        if store is None:
+            context_text = document_context.get(username)
+            store = build_clause_index(context_text) if context_text else None
+            save_clause_index(username, store)
+            if store is None:
+                return None
+        cache_clause_index(username, store)
+    return store
+
+def ensure_tenant_indexed(username: str) -> None:
+    """Re-index a user's stored context if the shared index lost it (e.g. after a crash)."""
+    assert multi_tenant_store is not None
+    if multi_tenant_store.tenant_size(username) == 0:
+        context_text = document_context.get(username)
+        if context_text:
+            multi_tenant_store.add(username, "restored", split_into_clauses(context_text))
+
+def index_upload(username: str, document_text: str) -> None:
+    """Append a new document to the user's context and index only its clauses."""
+    with user_lock(username):
+        if multi_tenant_store is not None:
+            ensure_tenant_indexed(username)
+            document_context.append(username, document_text)
+            multi_tenant_store.add(username, str(uuid.uuid4()), split_into_clauses(document_text))
+            return
+
+        store = get_clause_index(username)
+        document_context.append(username, document_text)
+
+        new_clauses = split_into_clauses(document_text)
+        if not new_clauses:
+            return
+        if store is None:
+            store = ClauseVectorStore()
+        store.add(new_clauses)
+        save_clause_index(username, store)
+        cache_clause_index(username, store)
+
+def retrieve_context(username: str, question: str) -> str:
+    """Return the top-k clauses from the user's documents relevant to the question."""
+    with user_lock(username):
+        if multi_tenant_store is not None:
+            ensure_tenant_indexed(username)
+            return "\n".join(
+                multi_tenant_store.query(
+                    username, question, top_k=RETRIEVAL_TOP_K,
+                    min_score=RETRIEVAL_MIN_SCORE, max_drop=RETRIEVAL_MAX_DROP,
+                    mode=RETRIEVAL_MODE,
+                )
+            )
+
+        store = get_clause_index(username)
+        if store is None:
+            return ""
+        return "\n".join(
+            store.query(
+                question, top_k=RETRIEVAL_TOP_K,
+                min_score=RETRIEVAL_MIN_SCORE, max_drop=RETRIEVAL_MAX_DROP,
+                mode=RETRIEVAL_MODE,
+            )
+        )
+
+def is_cacheable(answer: str) -> bool:
+    return not answer.startswith("Error generating answer")
+
+async def cached_answer(username: str, question: str, context: Optional[str]) -> str:
+    """Answer from the cache when the same question was asked over the same context."""
+    key = make_key(question, context, ANSWER_VERSION)
+    answer = answer_cache.get(key)
+    if answer is None:
+        answer = await answer_question_async(question, context)
+        if is_cacheable(answer):
+            answer_cache.put(username, key, answer)
+    return answer
+
+def sse_event(data: str, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Event; multi-line data is split across data: lines."""
+    lines = [f"event: {event}"] if event else []
+    lines += [f"data: {line}" for line in data.split("\n")]
+    return "\n".join(lines) + "\n\n"
+
+async def sse_answer(
+    username: str, question: str, context: Optional[str], log_prefix: str
+) -> AsyncIterator[str]:
+    """Forward answer pieces as SSE events, then log the full answer."""
+    key = make_key(question, context, ANSWER_VERSION)
+    answer = answer_cache.get(key)
+    if answer is not None:
+        yield sse_event(answer)
+    else:
+        pieces: List[str] = []
+        failed = False
+        try:
+            async for piece in stream_answer_async(question, context):
+                pieces.append(piece)
+                yield sse_event(piece)
+        except AnswerStreamError:
+            failed = True  # the error was already sent as the last piece
+        answer = "".join(pieces)
+        if not failed and is_cacheable(answer):
+            answer_cache.put(username, key, answer)
+    yield sse_event("", event="done")
+    logging.info(f"{log_prefix}\nA: {answer}\n{'-'*60}")
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 # -------------------------
 # User routes
@@ -97,83 +409,193 @@ async def register(user: User):
 @app.post("/login")
 async def login(user: User):
     if verify_user(user.username, user.password):
-        token = str(uuid.uuid4())
-        active_tokens[user.username] = token
+        token = token_store.issue(user.username)
         return {"access_token": token, "token_type": "bearer"}
     raise HTTPException(status_code=401, detail="Invalid credentials.")
 
+@app.get("/context", response_model=ContextStats)
+async def context_stats(username: str = Depends(get_current_user)):
+    return {
+        "user_bytes": document_context.user_bytes(username),
+        "total_bytes": document_context.total_bytes,
+        "spilled_bytes": document_context.spilled_bytes,
+        "user_index_bytes": clause_indexes.user_bytes(username),
+        "index_bytes": clause_indexes.total_bytes,
+        "indexes_in_memory": len(clause_indexes),
+    }
+
+@app.get("/cache/stats")
+async def cache_stats(username: str = Depends(get_current_user)):
+    return answer_cache.stats()
+
 # -------------------------
 # Text-only chat endpoint
 # -------------------------
 @app.post("/chat", response_model=ChatResponse)
 async def chat_text(
     query: str = Query(..., description="Question to ask the AI"),
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+    username: str = Depends(get_current_user)
 ):
-    # Token check
-    if not credentials or credentials.scheme.lower() != "bearer":
-        raise HTTPException(status_code=401, detail="Missing or invalid token")
-    
-    # Find username for this token
-    username: Optional[str] = next((u for u, t in active_tokens.items() if t == credentials.credentials), None)
-    if username is None:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     if not query.strip():
         raise HTTPException(status_code=400, detail="Query is empty")
     
-    # Include document context if exists
-    context_text = document_context.get(username, "")
-    final_query = f"{context_text}\n\nUser question: {query.strip()}" if context_text else query.strip()
-
     try:
-        answer = answer_question(final_query)
+        # Include only the clauses relevant to this question
+        context_text = await asyncio.to_thread(retrieve_context, username, query)
+        answer = await cached_answer(username, query, context_text or None)
         logging.info(f"User: {username}\nQ: {query}\nA: {answer}\n{'-'*60}")
         return {"answer": answer}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/stream")
+async def chat_text_stream(
+    query: str = Query(..., description="Question to ask the AI"),
+    username: str = Depends(get_current_user)
+):
+    """Same as /chat, but streams the answer as Server-Sent Events."""
+    if not query.strip():
+        raise HTTPException(status_code=400, detail="Query is empty")
+
+    try:
+        context_text = await asyncio.to_thread(retrieve_context, username, query)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return sse_response(
+        sse_answer(username, query, context_text or None, f"User: {username}\nQ: {query}")
+    )
+
 # -------------------------
 # File upload + optional query endpoint
 # -------------------------
-@app.post("/upload", response_model=ChatResponse)
-async def chat_file(
-    files: List[UploadFile] = File(..., description="Upload file(s) to provide context"),
-    query: Optional[str] = Form(None, description="Optional question to ask after uploading files"),
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
-):
-    # Token check
-    if not credentials or credentials.scheme.lower() != "bearer":
-        raise HTTPException(status_code=401, detail="Missing or invalid token")
-    
-    # Find username for this token
-    username: Optional[str] = next((u for u, t in active_tokens.items() if t == credentials.credentials), None)
-    if username is None:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
+async def ingest_upload(
+    username: str, files: List[UploadFile], query: Optional[str]
+) -> Tuple[str, str]:
+    """
+    Extract uploaded files into the user's context and re-index it.
+    Returns the (question, context) pair to send to the LLM.
+    """
     if not files:
         raise HTTPException(status_code=400, detail="No files uploaded")
 
-    # Extract text from all files
-    document_text = ""
-    for file in files:
-        document_text += extract_text_from_file(file) + "\n"
+    # Extract text from all files in parallel
+    texts = await asyncio.gather(*(extract_text_from_file(file) for file in files))
+    document_text = "".join(text + "\n" for text in texts)
 
-    # Save/update document context per user
-    if username:
-        existing_context = document_context.get(username, "")
-        document_context[username] = existing_context + "\n" + document_text if existing_context else document_text
+    try:
+        # New document: answers cached for this user are stale
+        answer_cache.invalidate_user(username)
 
-    # Combine document content with optional query
-    final_query = document_context.get(username, "").strip()
-    if query and query.strip():
-        final_query += f"\n\nUser question: {query.strip()}"
+        # Save/update document context per user and index only the new clauses
+        await asyncio.to_thread(index_upload, username, document_text)
+
+        if query and query.strip():
+            question = query.strip()
+            context_text = await asyncio.to_thread(retrieve_context, username, question)
+        else:
+            # No question: summarize from the opening clauses of the new document
+            question = "Summarize the key points of the uploaded document."
+            context_text = "\n".join(split_into_clauses(document_text)[:RETRIEVAL_TOP_K * 2])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return question, context_text
+
+@app.post("/upload", response_model=ChatResponse)
+async def chat_file(
+    files: List[UploadFile] = File(..., description="Upload file(s) to provide context"),
+    query: Optional[str] = Form(None, description="Optional question to ask after uploading files"),
+    username: str = Depends(get_current_user)
+):
+    question, context_text = await ingest_upload(username, files, query)
 
     try:
-        answer = answer_question(final_query)
+        answer = await cached_answer(username, question, context_text or None)
         logging.info(
             f"User: {username}\nFiles: {[f.filename for f in files]}\nQuery: {query}\nA: {answer}\n{'-'*60}"
         )
         return {"answer": answer}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/upload/stream")
+async def chat_file_stream(
+    files: List[UploadFile] = File(..., description="Upload file(s) to provide context"),
+    query: Optional[str] = Form(None, description="Optional question to ask after uploading files"),
+    username: str = Depends(get_current_user)
+):
+    """Same as /upload, but streams the answer as Server-Sent Events."""
+    question, context_text = await ingest_upload(username, files, query)
+
+    return sse_response(
+        sse_answer(
+            username,
+            question,
+            context_text or None,
+            f"User: {username}\nFiles: {[f.filename for f in files]}\nQuery: {query}",
+        )
+    )
+
+# -------------------------
+# Batch document + multi-question endpoint
+# -------------------------
+def retrieve_batch_contexts(documents: str, questions: List[str]) -> List[str]:
+    """
+    Parse and index the document once, then retrieve clauses for all questions in one search.
+    Pages are chunked and embedded as they are extracted, so indexing overlaps parsing.
+    """
+    store = ClauseVectorStore()
+    pending: List[str] = []
+    carry = ""
+    for piece in iter_documents_from_url(documents, executor=extraction_pool):
+        # Hold back the unfinished last sentence; it usually continues on the next page
+        text = f"{carry}\n{piece}" if carry else piece
+        boundaries = list(SENTENCE_END.finditer(text))
+        cut = boundaries[-1].end() if boundaries else 0
+        carry = text[cut:]
+        pending.extend(split_into_clauses(text[:cut]))
+        if len(pending) >= STREAM_INDEX_BATCH:
+            store.add(pending)
+            pending = []
+    pending.extend(split_into_clauses(carry))
+    store.add(pending)
+    if not store.clauses:
+        return ["" for _ in questions]
+    return [
+        "\n".join(clause for clause, _ in top)
+        for top in store.query_many(
+            questions, top_k=RETRIEVAL_TOP_K,
+            min_score=RETRIEVAL_MIN_SCORE, max_drop=RETRIEVAL_MAX_DROP,
+            mode=RETRIEVAL_MODE,
+        )
+    ]
+
+@app.post("/api/v1/run", response_model=QueryResponse)
+async def run_batch(
+    request: QueryRequest,
+    username: str = Depends(get_current_user)
+):
+    """Answer several questions about one document URL; answers keep input order."""
+    if not request.questions:
+        return {"answers": []}
+
+    try:
+        contexts = await asyncio.to_thread(retrieve_batch_contexts, request.documents, request.questions)
+    except ExtractionTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def answer_one(question: str, context_text: str) -> str:
+        async with limit:
+            answer = await cached_answer(username, question, context_text or None)
+        logging.info(f"User: {username}\nDocument: {request.documents}\nQ: {question}\nA: {answer}\n{'-'*60}")
+        return answer
+
+    answers = await asyncio.gather(
+        *(answer_one(q, c) for q, c in zip(request.questions, contexts))
+    )
+    return {"answers": list(answers)}
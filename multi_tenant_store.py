@@ -0,0 +1,457 @@
+# multi_tenant_store.py
+import base64
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import faiss
+import numpy as np
+
+try:
+    import fcntl  # single-writer lock on the store directory (POSIX only)
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore
+
+from lexical_index import LexicalIndex
+from vector_store import SEARCH_MODES, encode_texts, hybrid_search, select_relevant
+
+TENANT_SHIFT = 32
+SEQ_MASK = (1 << TENANT_SHIFT) - 1
+CODECS = {"none": "Flat", "fp16": "SQfp16", "sq8": "SQ8"}
+# SQ8 learns per-dimension ranges; until this many real vectors exist they stay in a flat index
+SQ8_MIN_TRAIN = 4096
+WAL_NAME = "wal.jsonl"
+# The log is checkpointed into a new snapshot once it grows past this size
+WAL_CHECKPOINT_BYTES = 64 * 1024 * 1024
+
+
+class _ReadWriteLock:
+    """Any number of readers or one writer; a waiting writer holds off new readers."""
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        with self._cond:
+            while self._writing or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+
+class MultiTenantVectorStore:
+    """
+    One ID-mapped FAISS index shared by every tenant.
+    Each vector id packs the tenant number in its high 32 bits and a per-tenant
+    sequence number in the low 32 bits, so restricting a search to one tenant
+    is a range selector and deleting a tenant is a single remove_ids call.
+
+    A store created with open() appends every add/delete to a write-ahead log
+    next to its snapshot, so a crash loses nothing. The log is checkpointed
+    into a new snapshot after replay and whenever it passes
+    wal_checkpoint_bytes. The directory is locked to one process: the store
+    supports a single server worker.
+
+    Changes are serialized by one lock; searches only wait for the short
+    moments when a change is applied to the index, not for embedding or
+    checkpoints, and run concurrently with each other.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "paraphrase-MiniLM-L3-v2",
+        quantization: str = "none",
+        use_embedding_cache: bool = True,
+        min_score: Optional[float] = None,
+        max_drop: Optional[float] = None,
+        wal_checkpoint_bytes: int = WAL_CHECKPOINT_BYTES,
+    ) -> None:
+        if quantization not in CODECS:
+            raise ValueError(f"Unsupported quantization for multi-tenant store: {quantization}")
+        self.model_name = model_name
+        self.quantization = quantization
+        self.use_embedding_cache = use_embedding_cache
+        self.min_score = min_score
+        self.max_drop = max_drop
+        self.wal_checkpoint_bytes = wal_checkpoint_bytes
+        self.index: Optional[faiss.Index] = None
+        self.built_quantization = "none"
+        self.tenants: Dict[str, int] = {}
+        self.entries: Dict[int, Tuple[str, str]] = {}  # vector id -> (doc_id, clause)
+        self._next_seq: Dict[int, int] = {}
+        self._docs: Dict[int, Dict[str, List[int]]] = {}  # tenant number -> doc_id -> vector ids
+        # tenant number -> (BM25 index, vector id per row), built on a tenant's first lexical search
+        self._lexical: Dict[int, Tuple[LexicalIndex, List[int]]] = {}
+        self._lexical_lock = threading.Lock()
+        self._lock = threading.RLock()  # serializes changes, logging and checkpoints
+        self._rw = _ReadWriteLock()  # searches vs. applying a change to the index
+        self._wal: Optional[IO[str]] = None
+        self._dir_lock: Optional[IO[str]] = None
+        self._directory: Optional[str] = None
+
+    def _ensure_index(self, dim: int) -> faiss.Index:
+        if self.index is None:
+            # SQ8 trained on anything but real embeddings wastes most of its 8-bit range,
+            # so it starts flat and is trained once enough vectors exist
+            codec = "none" if self.quantization == "sq8" else self.quantization
+            self.index = faiss.index_factory(dim, f"IDMap2,{CODECS[codec]}", faiss.METRIC_INNER_PRODUCT)
+            self.built_quantization = codec
+        return self.index
+
+    def _maybe_train_sq8(self) -> None:
+        """Rebuild the flat index as SQ8, trained on the stored vectors, once there are enough."""
+        if self.quantization != "sq8" or self.built_quantization == "sq8" or self.index is None:
+            return
+        if self.index.ntotal < SQ8_MIN_TRAIN:
+            return
+        flat = faiss.downcast_index(self.index.index)
+        vectors = faiss.vector_to_array(flat.codes).view("float32").reshape(-1, self.index.d)
+        ids = faiss.vector_to_array(self.index.id_map)
+        index = faiss.index_factory(self.index.d, f"IDMap2,{CODECS['sq8']}", faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)  # type: ignore
+        index.add_with_ids(vectors, ids)  # type: ignore
+        self.index = index
+        self.built_quantization = "sq8"
+
+    def _tenant_range(self, tenant: str) -> Optional[Tuple[int, int]]:
+        number = self.tenants.get(tenant)
+        if number is None:
+            return None
+        return number << TENANT_SHIFT, (number + 1) << TENANT_SHIFT
+
+    def add(self, tenant: str, doc_id: str, clauses: List[str]) -> None:
+        """Embed and add a tenant document's clauses."""
+        if not clauses:
+            return
+        embeddings = encode_texts(self.model_name, clauses, cached=self.use_embedding_cache)
+        with self._lock:
+            number = self.tenants.get(tenant, len(self.tenants))
+            start = self._next_seq.get(number, 0)
+            if start + len(clauses) > SEQ_MASK:
+                raise ValueError(f"Tenant {tenant} exceeded {SEQ_MASK} vectors")
+            ids = (np.arange(start, start + len(clauses), dtype="int64") | (number << TENANT_SHIFT))
+            self._log({
+                "op": "add", "tenant": tenant, "number": number, "doc": doc_id,
+                "ids": ids.tolist(), "clauses": clauses,
+                "vectors": base64.b64encode(np.ascontiguousarray(embeddings, dtype="float32").tobytes()).decode("ascii"),
+            })
+            self._apply_add(tenant, number, doc_id, ids, clauses, embeddings)
+            self._maybe_checkpoint()
+
+    def _apply_add(
+        self, tenant: str, number: int, doc_id: str, ids: np.ndarray, clauses: List[str], embeddings: np.ndarray
+    ) -> None:
+        with self._rw.write():
+            index = self._ensure_index(embeddings.shape[1])
+            self.tenants.setdefault(tenant, number)
+            index.add_with_ids(embeddings, ids)  # type: ignore
+            self._next_seq[number] = max(self._next_seq.get(number, 0), int(ids[-1] & SEQ_MASK) + 1)
+            for vector_id, clause in zip(ids.tolist(), clauses):
+                self.entries[vector_id] = (doc_id, clause)
+            self._docs.setdefault(number, {}).setdefault(doc_id, []).extend(ids.tolist())
+            if number in self._lexical:
+                lexical, row_ids = self._lexical[number]
+                lexical.add(clauses)
+                row_ids.extend(ids.tolist())
+            self._maybe_train_sq8()
+
+    def query(self, tenant: str, question: str, top_k: int = 4, **kwargs) -> List[str]:
+        return [clause for clause, _ in self.query_many(tenant, [question], top_k, **kwargs)[0]]
+
+    def query_many(
+        self,
+        tenant: str,
+        questions: List[str],
+        top_k: int = 4,
+        min_score: Optional[float] = None,
+        max_drop: Optional[float] = None,
+        doc_ids: Optional[List[str]] = None,
+        mode: str = "dense",
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Search only the tenant's vectors (optionally only some of its documents).
+        mode is "dense", "lexical", "hybrid" or "auto", as in
+        ClauseVectorStore.query_many; BM25 runs over the tenant's clauses only.
+        Returns (clause, score) pairs per question, best first.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        if not questions:
+            return []
+        with self._rw.read():
+            number = self.tenants.get(tenant)
+            if self.index is None or number is None:
+                return [[] for _ in questions]
+            allowed: Optional[Set[int]] = None
+            if doc_ids is not None:
+                docs = self._docs.get(number, {})
+                allowed = {i for doc in doc_ids for i in docs.get(doc, [])}
+
+        def dense_search(batch: List[str]) -> List[List[Tuple[int, float]]]:
+            q_embs = encode_texts(self.model_name, batch)
+            with self._rw.read():
+                return self._dense_search(number, q_embs, top_k, allowed, min_score, max_drop)
+
+        def lexical_search(question: str) -> List[Tuple[int, float]]:
+            with self._rw.read():
+                lexical, row_ids = self._tenant_lexical(number)
+                # With a document filter, rank everything and keep the allowed top_k
+                hits = lexical.search(question, top_k if allowed is None else len(lexical))
+                hits = [(row_ids[row], score) for row, score in hits]
+            if allowed is not None:
+                hits = [(i, score) for i, score in hits if i in allowed][:top_k]
+            return hits
+
+        hits = hybrid_search(questions, top_k, mode, lexical_search=lexical_search, dense_search=dense_search)
+        with self._rw.read():
+            return [[(self.entries[i][1], score) for i, score in row if i in self.entries] for row in hits]
+
+    def _dense_search(
+        self,
+        number: int,
+        q_embs: np.ndarray,
+        top_k: int,
+        allowed: Optional[Set[int]],
+        min_score: Optional[float],
+        max_drop: Optional[float],
+    ) -> List[List[Tuple[int, float]]]:
+        """Cosine search restricted to one tenant; (vector id, similarity) pairs per question."""
+        assert self.index is not None
+        selector = faiss.IDSelectorRange(number << TENANT_SHIFT, (number + 1) << TENANT_SHIFT)
+        if allowed is not None:
+            batch = faiss.IDSelectorBatch(np.array(sorted(allowed), dtype="int64"))
+            selector = faiss.IDSelectorAnd(selector, batch)
+        params = faiss.SearchParameters(sel=selector)
+        scores, ids = self.index.search(q_embs, top_k, params=params)  # type: ignore
+
+        min_score = self.min_score if min_score is None else min_score
+        max_drop = self.max_drop if max_drop is None else max_drop
+        return [
+            select_relevant(
+                [(int(i), float(score)) for i, score in zip(row_ids, row_scores) if int(i) in self.entries],
+                min_score=min_score,
+                max_drop=max_drop,
+            )
+            for row_ids, row_scores in zip(ids, scores)
+        ]
+
+    def _tenant_lexical(self, number: int) -> Tuple[LexicalIndex, List[int]]:
+        """
+        BM25 index over one tenant's clauses, built on first use and kept in step
+        by adds (deletes drop it). Rows map to vector ids. Callers hold a read lock.
+        """
+        with self._lexical_lock:
+            cached = self._lexical.get(number)
+            if cached is None:
+                row_ids = [i for ids in self._docs.get(number, {}).values() for i in ids]
+                lexical = LexicalIndex()
+                lexical.add([self.entries[i][1] for i in row_ids])
+                cached = self._lexical[number] = (lexical, row_ids)
+            return cached
+
+    def delete_tenant(self, tenant: str) -> int:
+        """Remove all of a tenant's vectors. Returns the number removed."""
+        with self._lock:
+            id_range = self._tenant_range(tenant)
+            if id_range is None or self.index is None:
+                return 0
+            self._log({"op": "delete_tenant", "tenant": tenant})
+            with self._rw.write():
+                self._lexical.pop(self.tenants[tenant], None)
+                removed = self.index.remove_ids(faiss.IDSelectorRange(*id_range))
+                for ids in self._docs.pop(self.tenants[tenant], {}).values():
+                    for vector_id in ids:
+                        del self.entries[vector_id]
+            self._maybe_checkpoint()
+            return int(removed)
+
+    def delete_document(self, tenant: str, doc_id: str) -> int:
+        """Remove one document's vectors from a tenant. Returns the number removed."""
+        with self._lock:
+            id_range = self._tenant_range(tenant)
+            if id_range is None or self.index is None:
+                return 0
+            ids = self._docs.get(self.tenants[tenant], {}).get(doc_id, [])
+            if not ids:
+                return 0
+            self._log({"op": "delete_document", "tenant": tenant, "doc": doc_id})
+            with self._rw.write():
+                self._lexical.pop(self.tenants[tenant], None)
+                del self._docs[self.tenants[tenant]][doc_id]
+                removed = self.index.remove_ids(faiss.IDSelectorBatch(np.array(ids, dtype="int64")))
+                for vector_id in ids:
+                    del self.entries[vector_id]
+            self._maybe_checkpoint()
+            return int(removed)
+
+    def tenant_size(self, tenant: str) -> int:
+        with self._rw.read():
+            number = self.tenants.get(tenant)
+            docs = self._docs.get(number, {}) if number is not None else {}
+            return sum(len(ids) for ids in docs.values())
+
+    def save(self, directory: str) -> None:
+        """
+        Persist the shared index and the id -> (tenant, document, clause) metadata.
+        The index goes to a new index-<version>.faiss and meta.json, which names
+        it, is replaced atomically, so a crash leaves the previous snapshot whole.
+        Searches keep running while the snapshot is written.
+        """
+        with self._lock:
+            if self.index is None:
+                return
+            path = Path(directory)
+            path.mkdir(parents=True, exist_ok=True)
+            version = time.time_ns()
+            index_name = f"index-{version}.faiss"
+            faiss.write_index(self.index, str(path / index_name))
+            meta = {
+                "model_name": self.model_name,
+                "quantization": self.quantization,
+                "built_quantization": self.built_quantization,
+                "version": version,
+                "index_file": index_name,
+                "tenants": self.tenants,
+                "next_seq": {str(k): v for k, v in self._next_seq.items()},
+                "entries": [[i, doc, clause] for i, (doc, clause) in self.entries.items()],
+            }
+            with open(path / "meta.json.tmp", "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path / "meta.json.tmp", path / "meta.json")
+            for stale in path.glob("index*.faiss"):
+                if stale.name != index_name:
+                    stale.unlink(missing_ok=True)
+            if self._wal is not None and Path(self._wal.name).parent == path:
+                # Everything logged so far is in the snapshot now
+                self._wal.truncate(0)
+                self._wal.seek(0)
+
+    @classmethod
+    def load(cls, directory: str, **kwargs) -> "MultiTenantVectorStore":
+        path = Path(directory)
+        with open(path / "meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        store = cls(meta["model_name"], quantization=meta["quantization"], **kwargs)
+        # Snapshots saved before versioned index files use a fixed name
+        store.index = faiss.read_index(str(path / meta.get("index_file", "index.faiss")))
+        store.built_quantization = meta.get("built_quantization", store.quantization)
+        store.tenants = meta["tenants"]
+        store._next_seq = {int(k): v for k, v in meta["next_seq"].items()}
+        store.entries = {i: (doc, clause) for i, doc, clause in meta["entries"]}
+        for vector_id, (doc, _) in store.entries.items():
+            store._docs.setdefault(vector_id >> TENANT_SHIFT, {}).setdefault(doc, []).append(vector_id)
+        return store
+
+    @classmethod
+    def open(cls, directory: str, **kwargs) -> "MultiTenantVectorStore":
+        """
+        Load the snapshot in directory (or start empty), replay the write-ahead
+        log on top of it and checkpoint the result, then log further changes
+        there. Raises RuntimeError if another process already has the directory open.
+        """
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        dir_lock = open(path / "LOCK", "w")
+        if fcntl is not None:
+            try:
+                fcntl.flock(dir_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                dir_lock.close()
+                raise RuntimeError(
+                    f"{directory} is in use by another process; the multi-tenant store supports a single worker"
+                )
+
+        if cls.exists(directory):
+            extra = {k: v for k, v in kwargs.items() if k not in ("model_name", "quantization")}
+            store = cls.load(directory, **extra)
+        else:
+            store = cls(**kwargs)
+        store._dir_lock = dir_lock
+        store._directory = str(path)
+        wal_path = path / WAL_NAME
+        if wal_path.exists():
+            store._replay(wal_path)
+        store._wal = open(wal_path, "a", encoding="utf-8", newline="\n")
+        if store._wal.tell() > 0:
+            store.save(store._directory)  # start from a clean log instead of replaying it again next time
+        return store
+
+    def close(self) -> None:
+        with self._lock:
+            for handle in (self._wal, self._dir_lock):
+                if handle is not None:
+                    handle.close()
+            self._wal = self._dir_lock = None
+
+    def _log(self, record: Dict[str, Any]) -> None:
+        if self._wal is None:
+            return
+        self._wal.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._wal.flush()
+        os.fsync(self._wal.fileno())
+
+    def _maybe_checkpoint(self) -> None:
+        """Snapshot the store and truncate the log once the log is over wal_checkpoint_bytes."""
+        if self._wal is not None and self._directory is not None and self._wal.tell() > self.wal_checkpoint_bytes:
+            self.save(self._directory)
+
+    def _replay(self, wal_path: Path) -> None:
+        """
+        Re-apply logged changes. Adds whose sequence numbers the snapshot has
+        already passed are skipped, so replaying over a newer snapshot adds nothing twice.
+        """
+        with open(wal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # partially written last record
+                if record["op"] == "add":
+                    ids = np.array(record["ids"], dtype="int64")
+                    if int(ids[0] & SEQ_MASK) < self._next_seq.get(record["number"], 0):
+                        continue
+                    vectors = np.frombuffer(base64.b64decode(record["vectors"]), dtype="float32")
+                    self._apply_add(
+                        record["tenant"], record["number"], record["doc"], ids,
+                        record["clauses"], vectors.reshape(len(ids), -1),
+                    )
+                elif record["op"] == "delete_tenant":
+                    self.delete_tenant(record["tenant"])
+                elif record["op"] == "delete_document":
+                    self.delete_document(record["tenant"], record["doc"])
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        path = Path(directory)
+        return (path / "meta.json").exists()
@@ -0,0 +1,26 @@
+# tests/test_extraction_pool.py
+import time
+
+import pytest
+
+from extraction_pool import ExtractionPool, ExtractionTimeout
+
+
+@pytest.fixture
+def pool():
+    extraction_pool = ExtractionPool(max_workers=2, timeout=2.0)
+    yield extraction_pool
+    extraction_pool.shutdown()
+
+
+def test_stuck_job_times_out_and_pool_recovers(pool):
+    stuck = pool.submit(time.sleep, 60, name="stuck.pdf")
+    with pytest.raises(ExtractionTimeout):
+        stuck.result()
+    assert pool.submit(pow, 2, 10).result() == 1024
+
+
+def test_queued_jobs_do_not_count_towards_the_timeout(pool):
+    # Six 0.8s jobs on two workers take ~2.4s in total, more than the 2s timeout
+    futures = [pool.submit(time.sleep, 0.8) for _ in range(6)]
+    assert [future.result() for future in futures] == [None] * 6
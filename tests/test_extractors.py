@@ -0,0 +1,37 @@
+# tests/test_extractors.py
+import random
+import sys
+from email.message import EmailMessage
+from pathlib import Path
+
+from extractors import detect_format
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+from bench_email import make_email  # noqa: E402
+
+
+def html_only_email() -> bytes:
+    message = EmailMessage()
+    message["Subject"] = "Claim update"
+    message["From"] = "claims@example.com"
+    message["To"] = "customer@example.com"
+    message.set_content("<html><body><p>Your claim was approved.</p></body></html>", subtype="html")
+    return message.as_bytes()
+
+
+def test_html_only_email_is_detected_as_eml():
+    assert detect_format(html_only_email(), "claim.eml") == "eml"
+    assert detect_format(html_only_email()) == "eml"
+
+
+def test_generated_emails_are_all_eml():
+    rng = random.Random(0)
+    for paragraphs in (2, 40):
+        for _ in range(50):
+            assert detect_format(make_email(rng, paragraphs)) == "eml"
+
+
+def test_html_detected_only_at_start():
+    assert detect_format(b"<!DOCTYPE html><html><body>x</body></html>") == "html"
+    assert detect_format(b"  <html><body>x</body></html>") == "html"
+    assert detect_format(b"Notes mention <html> and <body> tags in passing.") == "txt"
@@ -0,0 +1,111 @@
+# tests/test_http_fetch.py
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+from http_fetch import DownloadCache  # noqa: E402
+
+
+class PolicyServer(ThreadingHTTPServer):
+    """Serves one document whose body and ETag the test can change; records status codes sent."""
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), PolicyHandler)
+        self.body = b"Grace period is thirty days."
+        self.etag = '"v1"'
+        self.statuses = []
+        self.before_response = lambda: None
+
+
+class PolicyHandler(BaseHTTPRequestHandler):
+    server: PolicyServer
+
+    def do_GET(self) -> None:
+        self.server.before_response()
+        if self.headers.get("If-None-Match") == self.server.etag:
+            self.server.statuses.append(304)
+            self.send_response(304)
+            self.send_header("ETag", self.server.etag)
+            self.end_headers()
+            return
+        self.server.statuses.append(200)
+        self.send_response(200)
+        self.send_header("ETag", self.server.etag)
+        self.send_header("Content-Length", str(len(self.server.body)))
+        self.end_headers()
+        self.wfile.write(self.server.body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = PolicyServer()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_revalidates_and_refetches_on_change(server, tmp_path):
+    cache = DownloadCache(str(tmp_path))
+    url = f"http://127.0.0.1:{server.server_address[1]}/policy.txt"
+
+    path, content = cache.fetch_content(url, max_memory_bytes=1024)
+    assert content == b"Grace period is thirty days."
+    assert path.read_bytes() == content
+    assert server.statuses == [200]
+
+    path, content = cache.fetch_content(url, max_memory_bytes=1024)
+    assert content == b"Grace period is thirty days."
+    assert server.statuses == [200, 304]
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+    server.body = b"Grace period is fifteen days."
+    server.etag = '"v2"'
+    path, content = cache.fetch_content(url, max_memory_bytes=1024)
+    assert content == b"Grace period is fifteen days."
+    assert path.read_bytes() == content
+    assert server.statuses == [200, 304, 200]
+    assert cache.stats() == {"hits": 1, "misses": 2}
+
+
+def test_large_body_is_served_from_disk(server, tmp_path):
+    cache = DownloadCache(str(tmp_path))
+    url = f"http://127.0.0.1:{server.server_address[1]}/policy.txt"
+    path, content = cache.fetch_content(url, max_memory_bytes=4)
+    assert content is None
+    assert path.read_bytes() == server.body
+
+
+def test_url_locks_are_released(server, tmp_path):
+    cache = DownloadCache(str(tmp_path))
+    for name in ("a", "b", "c"):
+        cache.fetch(f"http://127.0.0.1:{server.server_address[1]}/{name}")
+    assert cache._url_locks == {}
+
+
+def test_refetches_when_body_disappears_before_304(server, tmp_path):
+    cache = DownloadCache(str(tmp_path))
+    url = f"http://127.0.0.1:{server.server_address[1]}/policy.txt"
+    path = cache.fetch(url)
+    # Removed after the cache decided to revalidate, before the 304 arrives
+    server.before_response = lambda: path.unlink(missing_ok=True)
+    path, content = cache.fetch_content(url, max_memory_bytes=1024)
+    assert content == b"Grace period is thirty days."
+    assert path.exists()
+    assert server.statuses == [200, 304, 200]
+
+
+def test_bodies_in_use_are_not_evicted(server, tmp_path):
+    cache = DownloadCache(str(tmp_path), max_disk_bytes=len(server.body))
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    with cache.open_content(f"{base}/a") as (path_a, _):
+        cache.fetch(f"{base}/b")  # over budget, but a is still being read
+        assert path_a.exists()
+    cache.fetch(f"{base}/c")
+    assert not path_a.exists()
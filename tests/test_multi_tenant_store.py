@@ -0,0 +1,89 @@
+# tests/test_multi_tenant_store.py
+import hashlib
+import shutil
+from typing import List
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("sentence_transformers")
+import multi_tenant_store  # noqa: E402
+from multi_tenant_store import WAL_NAME, MultiTenantVectorStore  # noqa: E402
+
+
+def fake_encode(model_name: str, texts: List[str], cached: bool = False) -> np.ndarray:
+    """Deterministic unit vectors per text, so no embedding model is needed."""
+    rows = [np.frombuffer(hashlib.sha256(t.encode()).digest(), dtype="uint8")[:16] for t in texts]
+    vectors = np.array(rows, dtype="float32") + 1.0
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture(autouse=True)
+def no_model(monkeypatch):
+    monkeypatch.setattr(multi_tenant_store, "encode_texts", fake_encode)
+
+
+def test_open_checkpoints_replayed_log(tmp_path):
+    store = MultiTenantVectorStore.open(str(tmp_path))
+    store.add("alice", "doc1", ["grace period is thirty days", "waiting period is two years"])
+    store.close()  # unclean: no save()
+    assert (tmp_path / WAL_NAME).stat().st_size > 0
+
+    store = MultiTenantVectorStore.open(str(tmp_path))
+    assert store.tenant_size("alice") == 2
+    assert (tmp_path / WAL_NAME).stat().st_size == 0
+    store.close()
+
+
+def test_log_is_checkpointed_past_threshold(tmp_path):
+    store = MultiTenantVectorStore.open(str(tmp_path), wal_checkpoint_bytes=1)
+    store.add("alice", "doc1", ["grace period is thirty days"])
+    assert (tmp_path / WAL_NAME).stat().st_size == 0
+    assert MultiTenantVectorStore.exists(str(tmp_path))
+    store.close()
+
+
+def test_replay_over_newer_snapshot_adds_nothing_twice(tmp_path):
+    store = MultiTenantVectorStore.open(str(tmp_path))
+    store.add("alice", "doc1", ["grace period is thirty days", "waiting period is two years"])
+    store.add("bob", "doc2", ["room rent is capped"])
+    store.delete_document("alice", "doc1")
+    shutil.copy(tmp_path / WAL_NAME, tmp_path / "wal.bak")
+    store.save(str(tmp_path))
+    store.close()
+    # Crash after the snapshot was committed but before the log was truncated
+    shutil.move(tmp_path / "wal.bak", tmp_path / WAL_NAME)
+
+    store = MultiTenantVectorStore.open(str(tmp_path))
+    assert store.index.ntotal == len(store.entries) == 1
+    assert store.tenant_size("alice") == 0
+    assert store.query("bob", "room rent") == ["room rent is capped"]
+    store.close()
+
+
+def test_crash_before_meta_is_replaced_keeps_old_snapshot(tmp_path):
+    store = MultiTenantVectorStore.open(str(tmp_path))
+    store.add("alice", "doc1", ["grace period is thirty days"])
+    store.save(str(tmp_path))
+    store.add("alice", "doc2", ["waiting period is two years"])
+    # A save that wrote its index file but died before replacing meta.json
+    multi_tenant_store.faiss.write_index(store.index, str(tmp_path / "index-99999999999999999999.faiss"))
+    store.close()
+
+    store = MultiTenantVectorStore.open(str(tmp_path))
+    assert store.index.ntotal == len(store.entries) == 2
+    store.close()
+
+
+def test_keyword_lookup_uses_tenant_bm25():
+    store = MultiTenantVectorStore()
+    store.add("alice", "doc1", ["PED means pre-existing disease", "room rent is capped at 1%"])
+    store.add("bob", "doc2", ["PED waiting period is 48 months"])
+    assert store.query("alice", "PED", mode="auto") == ["PED means pre-existing disease"]
+    assert store.query("bob", "PED", mode="lexical") == ["PED waiting period is 48 months"]
+    assert store.query("alice", "PED", mode="lexical", doc_ids=["missing"]) == []
+
+    store.delete_document("alice", "doc1")
+    store.add("alice", "doc3", ["PED cover starts after two years"])
+    assert store.query("alice", "PED", mode="lexical") == ["PED cover starts after two years"]
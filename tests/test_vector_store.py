@@ -0,0 +1,47 @@
+# tests/test_vector_store.py
+import json
+
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip("faiss")
+pytest.importorskip("sentence_transformers")
+from vector_store import ClauseVectorStore  # noqa: E402
+
+
+def make_store(n: int) -> ClauseVectorStore:
+    """A store over random unit vectors, so no embedding model is needed."""
+    vectors = np.random.default_rng(0).random((n, 8), dtype="float32")
+    faiss.normalize_L2(vectors)
+    store = ClauseVectorStore(index_type="flat", use_embedding_cache=False)
+    store.index = faiss.IndexFlatIP(8)
+    store.index.add(vectors)
+    store.clauses = [f"clause {i}" for i in range(n)]
+    return store
+
+
+def test_save_replaces_previous_version(tmp_path):
+    make_store(3).save(str(tmp_path))
+    make_store(5).save(str(tmp_path))
+    assert len(list(tmp_path.glob("index*.faiss"))) == 1
+    loaded = ClauseVectorStore.load(str(tmp_path), mmap=False)
+    assert loaded.index.ntotal == len(loaded.clauses) == 5
+
+
+def test_crash_before_clauses_are_replaced_keeps_old_store(tmp_path):
+    make_store(3).save(str(tmp_path))
+    # A save that wrote its new index file but died before replacing clauses.json
+    faiss.write_index(make_store(5).index, str(tmp_path / "index-99999999999999999999.faiss"))
+    loaded = ClauseVectorStore.load(str(tmp_path), mmap=False)
+    assert loaded.clauses == ["clause 0", "clause 1", "clause 2"]
+    assert loaded.index.ntotal == 3
+
+
+def test_out_of_sync_store_raises_value_error(tmp_path):
+    make_store(3).save(str(tmp_path))
+    meta_path = tmp_path / "clauses.json"
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    meta["clauses"].append("orphan clause")
+    meta_path.write_text(json.dumps(meta), encoding="utf-8")
+    with pytest.raises(ValueError):
+        ClauseVectorStore.load(str(tmp_path), mmap=False)
@@ -0,0 +1,74 @@
+# token_store.py
+import asyncio
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+@dataclass
+class Session:
+    username: str
+    expires_at: float
+
+
+class TokenStore:
+    """
+    In-memory bearer token store with O(1) lookup and TTL expiry.
+    Keeps a token -> session map for authentication and a username -> token
+    map so a new login replaces (and frees) the user's previous token.
+    """
+
+    def __init__(self, ttl_seconds: float) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._sessions: Dict[str, Session] = {}
+        self._user_tokens: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def issue(self, username: str) -> str:
+        """Create a new token for a user, revoking any previous one."""
+        token = str(uuid.uuid4())
+        with self._lock:
+            old_token = self._user_tokens.pop(username, None)
+            if old_token is not None:
+                self._sessions.pop(old_token, None)
+            self._sessions[token] = Session(username, time.monotonic() + self.ttl_seconds)
+            self._user_tokens[username] = token
+        return token
+
+    def get_username(self, token: str) -> Optional[str]:
+        """Return the username for a live token, or None if unknown/expired."""
+        session = self._sessions.get(token)
+        if session is None:
+            return None
+        if session.expires_at <= time.monotonic():
+            self.revoke(token)
+            return None
+        return session.username
+
+    def revoke(self, token: str) -> None:
+        with self._lock:
+            session = self._sessions.pop(token, None)
+            if session is not None and self._user_tokens.get(session.username) == token:
+                del self._user_tokens[session.username]
+
+    def sweep(self) -> int:
+        """Drop all expired sessions. Returns the number removed."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [t for t, s in self._sessions.items() if s.expires_at <= now]
+            for token in expired:
+                session = self._sessions.pop(token)
+                if self._user_tokens.get(session.username) == token:
+                    del self._user_tokens[session.username]
+        return len(expired)
+
+    async def run_sweeper(self, interval_seconds: float = 60.0) -> None:
+        """Background task that periodically sweeps expired sessions."""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            self.sweep()
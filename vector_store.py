@@ -1,8 +1,222 @@
 # vector_store.py
-from typing import List, Optional
+from typing import Callable, List, Optional, Tuple, TypeVar
+from pathlib import Path
+import json
+import os
+import time
 import numpy as np
 from sentence_transformers import SentenceTransformer
 import faiss
+from embedding_models import get_model
+from embedding_cache import EmbeddingCache, get_cache
+from lexical_index import LexicalIndex, looks_like_keyword_query, reciprocal_rank_fusion, relative_cutoff
+
+T = TypeVar("T")
+
+# Corpus sizes at which "auto" moves from exact to approximate search
+HNSW_MIN_CLAUSES = 20_000
+IVF_MIN_CLAUSES = 500_000
+INDEX_TYPES = ("auto", "flat", "hnsw", "ivf")
+QUANTIZATIONS = ("none", "fp16", "sq8", "pq")
+# PQ trains 256 centroids per sub-quantizer and needs ~39 points per centroid
+PQ_MIN_TRAIN = 256 * 39
+SEARCH_MODES = ("dense", "lexical", "hybrid", "auto")
+# "auto" answers keyword lookups of at most this many terms from the lexical index alone
+KEYWORD_QUERY_MAX_TERMS = 3
+# BM25 hits scoring below this fraction of the best hit are dropped before use or fusion
+LEXICAL_MIN_RATIO = 0.5
+
+
+def choose_index_type(n_clauses: int) -> str:
+    """Pick an index type for a corpus size: exact when small, HNSW when large, IVF when huge."""
+    if n_clauses < HNSW_MIN_CLAUSES:
+        return "flat"
+    if n_clauses < IVF_MIN_CLAUSES:
+        return "hnsw"
+    return "ivf"
+
+
+def resolve_quantization(quantization: str, n_clauses: int) -> str:
+    """PQ codebooks need enough training points; smaller corpora fall back to sq8."""
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization: {quantization}")
+    if quantization == "pq" and n_clauses < PQ_MIN_TRAIN:
+        return "sq8"
+    return quantization
+
+
+def create_index(
+    embeddings: np.ndarray,
+    index_type: str = "auto",
+    ef_search: int = 64,
+    nprobe: int = 16,
+    hnsw_m: int = 32,
+    quantization: str = "none",
+    pq_m: Optional[int] = None,
+) -> faiss.Index:
+    """
+    Build an inner-product FAISS index of the requested type over the embeddings.
+    Embeddings are expected to be L2-normalized, so scores are cosine similarities.
+    quantization stores vectors as "fp16", "sq8" (int8) or "pq" codes instead of float32.
+    IVF lists and quantizers are trained on the embeddings themselves.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {index_type}")
+    n, dim = embeddings.shape
+    if index_type == "auto":
+        index_type = choose_index_type(n)
+    quantization = resolve_quantization(quantization, n)
+
+    if quantization == "pq":
+        # Sub-quantizers must divide dim; aim for ~8 dims each
+        pq_m = pq_m or max(m for m in range(1, dim // 8 + 1) if dim % m == 0)
+    codec = {"none": "Flat", "fp16": "SQfp16", "sq8": "SQ8", "pq": f"PQ{pq_m}"}[quantization]
+
+    if index_type == "hnsw":
+        description = f"HNSW{hnsw_m}" if quantization == "none" else f"HNSW{hnsw_m}_{codec}"
+    elif index_type == "ivf":
+        # ~4*sqrt(n) lists, keeping at least 39 training points per list
+        nlist = max(1, min(int(4 * np.sqrt(n)), n // 39))
+        description = f"IVF{nlist},{codec}"
+    else:
+        description = codec
+
+    index = faiss.index_factory(dim, description, faiss.METRIC_INNER_PRODUCT)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efConstruction = max(2 * hnsw_m, ef_search)
+    if not index.is_trained:
+        index.train(embeddings)  # type: ignore
+
+    set_search_params(index, ef_search=ef_search, nprobe=nprobe)
+    index.add(embeddings)  # type: ignore  # Ignore Pylance/C++ signature issue
+    return index
+
+
+def is_quantized(index: faiss.Index) -> bool:
+    """True when the index stores lossy codes rather than float32 vectors."""
+    return not isinstance(index, (faiss.IndexFlat, faiss.IndexHNSWFlat, faiss.IndexIVFFlat))
+
+
+def index_type_of(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def set_search_params(
+    index: faiss.Index, ef_search: Optional[int] = None, nprobe: Optional[int] = None
+) -> None:
+    """Tune recall vs latency: efSearch for HNSW, nprobe for IVF. No-op for flat."""
+    if ef_search is not None and isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+    if nprobe is not None and isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(nprobe, index.nlist)
+
+
+def select_relevant(
+    hits: List[Tuple[T, float]],
+    min_score: Optional[float] = None,
+    max_drop: Optional[float] = None,
+) -> List[Tuple[T, float]]:
+    """
+    Trim best-first (item, score) hits: drop those under min_score, and cut the
+    list at the first gap where the score falls by more than max_drop.
+    """
+    selected: List[Tuple[T, float]] = []
+    for clause, score in hits:
+        if min_score is not None and score < min_score:
+            break
+        if max_drop is not None and selected and selected[-1][1] - score > max_drop:
+            break
+        selected.append((clause, score))
+    return selected
+
+
+def hybrid_search(
+    questions: List[str],
+    top_k: int,
+    mode: str,
+    lexical_search: Callable[[str], List[Tuple[int, float]]],
+    dense_search: Callable[[List[str]], List[List[Tuple[int, float]]]],
+) -> List[List[Tuple[int, float]]]:
+    """
+    Run the retrievers a search mode needs and combine their best-first
+    (id, score) hits per question, as described in ClauseVectorStore.query_many.
+    lexical_search returns raw BM25 hits for one question; dense_search is
+    called once with every question that needs dense retrieval.
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode}")
+    lexical: List[List[Tuple[int, float]]] = [[] for _ in questions]
+    if mode != "dense":
+        lexical = [relative_cutoff(lexical_search(q), LEXICAL_MIN_RATIO) for q in questions]
+
+    use_dense = [
+        mode in ("dense", "hybrid")
+        or (mode == "auto" and not (lexical[i] and looks_like_keyword_query(q, KEYWORD_QUERY_MAX_TERMS)))
+        for i, q in enumerate(questions)
+    ]
+    dense_positions = [i for i, needed in enumerate(use_dense) if needed]
+    dense: List[List[Tuple[int, float]]] = [[] for _ in questions]
+    if dense_positions:
+        for i, hits in zip(dense_positions, dense_search([questions[i] for i in dense_positions])):
+            dense[i] = hits
+
+    results: List[List[Tuple[int, float]]] = []
+    for i in range(len(questions)):
+        if mode == "dense":
+            results.append(dense[i])
+        elif not use_dense[i]:
+            results.append(lexical[i])
+        else:
+            rankings = [[doc_id for doc_id, _ in dense[i]], [doc_id for doc_id, _ in lexical[i]]]
+            results.append(reciprocal_rank_fusion(rankings)[:top_k])
+    return results
+
+
+def encode_texts(model_name: str, texts: List[str], cached: bool = False) -> np.ndarray:
+    """
+    Embed texts with the shared model as unit-length float32 vectors.
+    With cached=True, only texts missing from the embedding cache are run through the model.
+    """
+    model = get_model(model_name)
+
+    def encode(batch: List[str]) -> np.ndarray:
+        return model.encode(batch, convert_to_numpy=True, show_progress_bar=False).astype("float32")
+
+    if cached:
+        embeddings = get_cache(model_name, model.get_sentence_embedding_dimension()).encode(texts, encode)
+    else:
+        embeddings = encode(texts)
+    assert embeddings.ndim == 2, "Embeddings must be 2D (n_clauses, dim)"
+    # Unit length, so inner product is cosine similarity
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+
+def index_memory_bytes(index: faiss.Index) -> int:
+    """
+    Approximate resident size of an index from its vector count, without
+    serializing it: the stored codes, plus HNSW neighbor links or IVF list ids
+    and centroids.
+    """
+    if isinstance(index, faiss.IndexHNSW):
+        # Layer-0 links dominate; offsets and levels add ~12 bytes per vector
+        links = index.ntotal * (index.hnsw.nb_neighbors(0) * 4 + 12)
+        return index_memory_bytes(faiss.downcast_index(index.storage)) + links
+    if isinstance(index, faiss.IndexIVF):
+        return index.ntotal * (index.code_size + 8) + index.nlist * index.d * 4
+    return index.ntotal * getattr(index, "code_size", index.d * 4)
+
+
+def reconstruct_all(index: faiss.Index) -> np.ndarray:
+    """Read every stored vector back out of an index."""
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
 
 class ClauseVectorStore:
     """
@@ -11,44 +225,352 @@ class ClauseVectorStore:
     """
 
     clauses: List[str]
-    index: Optional[faiss.IndexFlatL2]  # Allow None initially
-    model: SentenceTransformer
+    index: Optional[faiss.Index]  # Allow None initially
+    model_name: str
 
-    def __init__(self, model_name: str = "paraphrase-MiniLM-L3-v2") -> None:
-        """Initialize SBERT model and placeholders for clauses and FAISS index."""
-        self.model = SentenceTransformer(model_name)
+    def __init__(
+        self,
+        model_name: str = "paraphrase-MiniLM-L3-v2",
+        index_type: str = "auto",
+        ef_search: int = 64,
+        nprobe: int = 16,
+        min_score: Optional[float] = None,
+        max_drop: Optional[float] = None,
+        use_embedding_cache: bool = True,
+        quantization: str = "none",
+        rerank: bool = True,
+        rerank_factor: int = 4,
+    ) -> None:
+        """
+        Set up placeholders for clauses and FAISS index; the SBERT model is shared and loaded lazily.
+        index_type is "flat", "hnsw", "ivf", or "auto" to choose by corpus size.
+        min_score and max_drop are the default relevance cutoffs for queries.
+        With use_embedding_cache, clause embeddings are reused across stores and restarts.
+        quantization ("none", "fp16", "sq8", "pq") shrinks the index; with rerank, a
+        shortlist of top_k * rerank_factor hits is re-scored with the exact vectors
+        from the embedding cache.
+        """
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}")
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self.model_name = model_name
+        self.index_type = index_type
+        self.ef_search = ef_search
+        self.nprobe = nprobe
+        self.min_score = min_score
+        self.max_drop = max_drop
+        self.use_embedding_cache = use_embedding_cache
+        self.quantization = quantization
+        self.rerank = rerank
+        self.rerank_factor = rerank_factor
         self.index = None
         self.clauses = []
+        self.built_quantization = "none"
+        self._lexical: Optional[LexicalIndex] = None
+        # Set when the index is memory-mapped read-only from this file
+        self._mmap_file: Optional[str] = None
+
+    @property
+    def model(self) -> SentenceTransformer:
+        """Process-wide SBERT model, loaded on first use."""
+        return get_model(self.model_name)
 
     def build_index(self, clauses: List[str]) -> None:
         """
         Build FAISS index from a list of clauses.
         """
-        self.clauses = clauses
+        self.clauses = list(clauses)
 
         # Encode clauses into embeddings
-        embeddings: np.ndarray = self.model.encode(
-            clauses, convert_to_numpy=True, show_progress_bar=False
-        ).astype("float32")
-        assert embeddings.ndim == 2, "Embeddings must be 2D (n_clauses, dim)"
+        embeddings = self._encode(self.clauses, cached=True)
 
         # Build FAISS index
-        self.index = faiss.IndexFlatL2(embeddings.shape[1])
-        self.index.add(embeddings)  # type: ignore  # Ignore Pylance/C++ signature issue
+        self.index = self._create_index(embeddings)
+        self._mmap_file = None
+        self._lexical = None
+
+    def _create_index(self, embeddings: np.ndarray, index_type: Optional[str] = None) -> faiss.Index:
+        self.built_quantization = resolve_quantization(self.quantization, len(embeddings))
+        return create_index(
+            embeddings, index_type or self.index_type,
+            ef_search=self.ef_search, nprobe=self.nprobe, quantization=self.quantization,
+        )
+
+    def add(self, clauses: List[str]) -> None:
+        """
+        Append clauses to the existing index, encoding only the new ones.
+        Builds the index from scratch if none exists yet.
+        """
+        if not clauses:
+            return
+        if self.index is None:
+            self.build_index(clauses)
+            return
+
+        embeddings = self._encode(clauses, cached=True)
+
+        if self._mmap_file is not None:
+            # A read-only memory-mapped index cannot grow; load it into memory first
+            self.index = faiss.read_index(self._mmap_file)
+            set_search_params(self.index, ef_search=self.ef_search, nprobe=self.nprobe)
+            self._mmap_file = None
+
+        total = len(self.clauses) + len(clauses)
+        current_type = index_type_of(self.index)
+        target_type = choose_index_type(total) if self.index_type == "auto" else current_type
+        outgrew_type = target_type != current_type and current_type != "ivf"
+        outgrew_codec = resolve_quantization(self.quantization, total) != self.built_quantization
+        if outgrew_type or outgrew_codec:
+            # Corpus outgrew its index type or codec: rebuild from stored vectors (no re-encoding)
+            stored = self._stored_vectors()
+            self.index = self._create_index(np.vstack([stored, embeddings]), target_type)
+        else:
+            self.index.add(embeddings)  # type: ignore
+        self.clauses.extend(clauses)
+        if self._lexical is not None:
+            self._lexical.add(clauses)
+
+    def _cache(self) -> Optional[EmbeddingCache]:
+        if not self.use_embedding_cache:
+            return None
+        return get_cache(self.model_name, self.model.get_sentence_embedding_dimension())
+
+    def _stored_vectors(self) -> np.ndarray:
+        """Full-precision vectors of the indexed clauses, from the cache when possible."""
+        cache = self._cache()
+        vectors = cache.lookup(self.clauses) if cache is not None else None
+        if vectors is None:
+            vectors = reconstruct_all(self.index)
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    def _encode(self, texts: List[str], cached: bool = False) -> np.ndarray:
+        return encode_texts(self.model_name, texts, cached=cached and self.use_embedding_cache)
+
+    def set_search_params(self, ef_search: Optional[int] = None, nprobe: Optional[int] = None) -> None:
+        """Adjust efSearch (HNSW) or nprobe (IVF) on the built index."""
+        if ef_search is not None:
+            self.ef_search = ef_search
+        if nprobe is not None:
+            self.nprobe = nprobe
+        if self.index is not None:
+            set_search_params(self.index, ef_search=ef_search, nprobe=nprobe)
+
+    def query(
+        self,
+        question: str,
+        top_k: int = 4,
+        min_score: Optional[float] = None,
+        max_drop: Optional[float] = None,
+        mode: str = "dense",
+    ) -> List[str]:
+        """
+        Query up to top_k relevant clauses for a question.
+        """
+        hits = self.query_many([question], top_k, min_score=min_score, max_drop=max_drop, mode=mode)[0]
+        return [clause for clause, _ in hits]
+
+    def query_many(
+        self,
+        questions: List[str],
+        top_k: int = 4,
+        min_score: Optional[float] = None,
+        max_drop: Optional[float] = None,
+        mode: str = "dense",
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Query up to top_k clauses for several questions at once.
+        All dense questions are encoded in one batch and searched in one FAISS matrix call.
 
-    def query(self, question: str, top_k: int = 4) -> List[str]:
+        mode picks the retriever: "dense" (cosine, trimmed by min_score/max_drop,
+        defaulting to the store's cutoffs), "lexical" (BM25, trimmed to hits within
+        LEXICAL_MIN_RATIO of the best), "hybrid" (both trimmed lists, fused by
+        reciprocal rank), or "auto" (lexical alone for keyword lookups like "PED"
+        that have lexical hits, otherwise hybrid). Returns, per question,
+        (clause, score) pairs best first; the score is the cosine similarity,
+        BM25 score or fused RRF score respectively.
         """
-        Query the top_k most relevant clauses for a question.
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        if self.index is None:
+            raise ValueError("Index not built. Call build_index first.")
+        if not questions:
+            return []
+
+        hits = hybrid_search(
+            questions, top_k, mode,
+            lexical_search=lambda q: self.lexical_index().search(q, top_k),
+            dense_search=lambda batch: self._dense_search(batch, top_k, min_score, max_drop),
+        )
+        return [[(self.clauses[doc_id], score) for doc_id, score in row] for row in hits]
+
+    def lexical_index(self) -> LexicalIndex:
+        """BM25 index over the clauses, built on first use and kept in step by add()."""
+        if self._lexical is None:
+            self._lexical = LexicalIndex()
+            self._lexical.add(self.clauses)
+        return self._lexical
+
+    def _dense_search(
+        self,
+        questions: List[str],
+        top_k: int,
+        min_score: Optional[float],
+        max_drop: Optional[float],
+    ) -> List[List[Tuple[int, float]]]:
+        """Cosine search for a batch of questions; (row id, similarity) pairs per question."""
+        q_embs = self._encode(questions)
+        assert q_embs.shape[0] == len(questions), "Question embeddings must be (n_questions, dim)"
+
+        assert self.index is not None
+        cache = self._cache() if self.rerank and is_quantized(self.index) else None
+        shortlist = top_k * self.rerank_factor if cache is not None else top_k
+        scores, indices = self.index.search(q_embs, shortlist)  # type: ignore
+        if cache is not None:
+            scores, indices = self._rerank(cache, q_embs, scores, indices, top_k)
+
+        min_score = self.min_score if min_score is None else min_score
+        max_drop = self.max_drop if max_drop is None else max_drop
+        return [
+            select_relevant(
+                [
+                    (int(i), float(score))
+                    for i, score in zip(row_indices, row_scores)
+                    if 0 <= i < len(self.clauses)
+                ],
+                min_score=min_score,
+                max_drop=max_drop,
+            )
+            for row_indices, row_scores in zip(indices, scores)
+        ]
+
+    def _rerank(
+        self,
+        cache: EmbeddingCache,
+        q_embs: np.ndarray,
+        scores: np.ndarray,
+        indices: np.ndarray,
+        top_k: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Re-score a quantized shortlist with exact cached vectors and keep the best top_k."""
+        out_scores = scores[:, :top_k].copy()
+        out_indices = indices[:, :top_k].copy()
+        for row, (q_emb, candidates) in enumerate(zip(q_embs, indices)):
+            candidates = candidates[(candidates >= 0) & (candidates < len(self.clauses))]
+            vectors = cache.lookup([self.clauses[i] for i in candidates])
+            if vectors is None:
+                continue  # not all candidates cached: keep the quantized ranking
+            faiss.normalize_L2(vectors)
+            exact = vectors @ q_emb
+            order = np.argsort(-exact)[:top_k]
+            out_indices[row] = -1
+            out_indices[row, :len(order)] = candidates[order]
+            out_scores[row, :len(order)] = exact[order]
+        return out_scores, out_indices
+
+    def memory_bytes(self) -> int:
+        """
+        Approximate in-memory size: index codes and links, clause texts and the
+        BM25 postings once built. A memory-mapped index lives in the page cache
+        and is not counted.
+        """
+        index_bytes = 0
+        if self.index is not None and self._mmap_file is None:
+            index_bytes = index_memory_bytes(self.index)
+        lexical_bytes = self._lexical.memory_bytes() if self._lexical is not None else 0
+        return index_bytes + lexical_bytes + sum(len(clause.encode("utf-8")) for clause in self.clauses)
+
+    def save(self, directory: str) -> None:
+        """
+        Persist the FAISS index, clause texts and metadata to a directory.
+        Each save writes a new index-<version>.faiss, then atomically replaces
+        clauses.json, which names that file and records the clause count. A
+        crash at any point leaves the previous pair intact.
         """
         if self.index is None:
             raise ValueError("Index not built. Call build_index first.")
 
-        # Encode the question
-        q_emb: np.ndarray = self.model.encode([question], convert_to_numpy=True).astype("float32")
-        assert q_emb.ndim == 2 and q_emb.shape[0] == 1, "Question embedding must be shape (1, dim)"
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+
+        version = time.time_ns()
+        index_name = f"index-{version}.faiss"
+        faiss.write_index(self.index, str(path / index_name))
+        meta = {
+            "model_name": self.model_name,
+            "index_type": self.index_type,
+            "built_index_type": index_type_of(self.index),
+            "quantization": self.quantization,
+            "built_quantization": self.built_quantization,
+            "metric": "cosine",
+            "ef_search": self.ef_search,
+            "nprobe": self.nprobe,
+            "dim": self.index.d,
+            "version": version,
+            "index_file": index_name,
+            "count": len(self.clauses),
+            "clauses": self.clauses,
+        }
+        with open(path / "clauses.json.tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path / "clauses.json.tmp", path / "clauses.json")
+
+        # Older versions are no longer referenced (a memory-mapped one stays readable until closed)
+        for stale in path.glob("index*.faiss"):
+            if stale.name != index_name:
+                stale.unlink(missing_ok=True)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "ClauseVectorStore":
+        """
+        Reopen a store written by save() without re-encoding any clause.
+        The index is memory-mapped read-only when the FAISS build supports it.
+        Raises ValueError if the index and clauses do not match.
+        """
+        path = Path(directory)
+        with open(path / "clauses.json", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        store = cls(
+            meta["model_name"],
+            index_type=meta.get("index_type", "flat"),
+            ef_search=meta.get("ef_search", 64),
+            nprobe=meta.get("nprobe", 16),
+            quantization=meta.get("quantization", "none"),
+        )
+        store.clauses = meta["clauses"]
+        store.built_quantization = meta.get("built_quantization", "none")
+
+        # Stores saved before versioned index files use a fixed name
+        index_file = str(path / meta.get("index_file", "index.faiss"))
+        if mmap:
+            try:
+                store.index = faiss.read_index(index_file, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                store._mmap_file = index_file
+            except RuntimeError:
+                store.index = faiss.read_index(index_file)
+        else:
+            store.index = faiss.read_index(index_file)
+
+        if store.index.ntotal != len(store.clauses) or meta.get("count", len(store.clauses)) != len(store.clauses):
+            raise ValueError(
+                f"Index and clauses are out of sync in {directory}: "
+                f"{store.index.ntotal} vectors, {len(store.clauses)} clauses"
+            )
 
-        # Perform FAISS search
-        distances, indices = self.index.search(q_emb, top_k)  # type: ignore
+        if meta.get("metric") != "cosine":
+            # Stores saved before cosine search hold raw L2 vectors: normalize and re-index them
+            vectors = reconstruct_all(faiss.read_index(index_file))
+            faiss.normalize_L2(vectors)
+            store.index = store._create_index(vectors)
+            store._mmap_file = None
+        set_search_params(store.index, ef_search=store.ef_search, nprobe=store.nprobe)
+        return store
 
-        # Return matched clauses
-        return [self.clauses[i] for i in indices[0] if 0 <= i < len(self.clauses)]
+    @staticmethod
+    def exists(directory: str) -> bool:
+        path = Path(directory)
+        return (path / "clauses.json").exists()